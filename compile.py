@@ -1,12 +1,64 @@
 """ Example of usage:
 python compile.py <program-to-compile>
 """
-from nodes import AST
+from nodes import AST, ProgramMemory
 from parser_lexer import parser
-import sys
+import argparse
 
-if len(sys.argv) > 1:
-    with open(sys.argv[1], "r") as f:
+arg_parser = argparse.ArgumentParser()
+arg_parser.add_argument("source", nargs="?")
+arg_parser.add_argument(
+    "-O0",
+    dest="no_optimizations",
+    action="store_true",
+    help="disable all optimizations",
+)
+arg_parser.add_argument(
+    "--no-evaluate",
+    action="store_true",
+    help="do not run input-free programs at compile time",
+)
+arg_parser.add_argument(
+    "--fuel",
+    type=int,
+    default=ProgramMemory.evaluation_fuel,
+    help="number of statements compile time evaluation may execute",
+)
+arg_parser.add_argument(
+    "--evaluation-bytes",
+    type=int,
+    default=ProgramMemory.evaluation_bytes,
+    help="number of string and output bytes compile time evaluation may produce",
+)
+arg_parser.add_argument(
+    "--fast-math",
+    action="store_true",
+    help="allow float arithmetic to be reassociated and simplified, and mark it fast",
+)
+args = arg_parser.parse_args()
+ProgramMemory.partial_evaluation = not args.no_evaluate
+ProgramMemory.evaluation_fuel = args.fuel
+ProgramMemory.evaluation_bytes = args.evaluation_bytes
+ProgramMemory.fast_math = args.fast_math
+if args.no_optimizations:
+    ProgramMemory.partial_evaluation = False
+    ProgramMemory.dead_code_elimination = False
+    ProgramMemory.dead_store_elimination = False
+    ProgramMemory.algebraic_simplification = False
+    ProgramMemory.register_promotion = False
+    ProgramMemory.value_numbering = False
+    ProgramMemory.loop_invariant_code_motion = False
+    ProgramMemory.control_flow_simplification = False
+    ProgramMemory.if_conversion = False
+    ProgramMemory.strength_reduction = False
+    ProgramMemory.switch_lowering = False
+    ProgramMemory.string_folding = False
+    ProgramMemory.write_merging = False
+    ProgramMemory.conversion_caching = False
+    ProgramMemory.no_signed_wrap = False
+
+if args.source:
+    with open(args.source, "r") as f:
         data = f.read()
 else:
     data = """
@@ -36,3 +88,6 @@ ast = AST(result)
 ast.check_semantic_errors()
 
 ast.create_llvm_output("output")
+
+for statistic, count in ProgramMemory.optimization_statistics.items():
+    print(f"{statistic}: {count}")
@@ -0,0 +1,8 @@
+from .function import Function, BasicBlock
+from .dominance import DominatorTree
+from .mem2reg import promote_memory_to_registers
+from .value_numbering import number_values_locally
+from .licm import hoist_loop_invariants
+from .simplify_cfg import simplify_control_flow
+from .if_conversion import convert_branches_to_selects
+from .strength_reduction import reduce_strength
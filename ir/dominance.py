@@ -0,0 +1,76 @@
+from .function import Function
+
+
+class DominatorTree(object):
+    """Dominators of the reachable blocks of a function.
+
+    Uses the iterative algorithm of Cooper, Harvey and Kennedy over the
+    reverse postorder of the control flow graph.
+    """
+
+    def __init__(self, function: Function) -> None:
+        self.order = function.reverse_postorder()
+        self.predecessors = function.predecessors()
+        position = {label: i for i, label in enumerate(self.order)}
+        entry = self.order[0]
+        self.idom = {entry: entry}
+        changed = True
+        while changed:
+            changed = False
+            for label in self.order[1:]:
+                processed = [p for p in self.predecessors[label] if p in self.idom]
+                new_idom = processed[0]
+                for predecessor in processed[1:]:
+                    new_idom = self.__intersect(predecessor, new_idom, position)
+                if self.idom.get(label) != new_idom:
+                    self.idom[label] = new_idom
+                    changed = True
+        self.children = {label: [] for label in self.order}
+        for label in self.order[1:]:
+            self.children[self.idom[label]].append(label)
+
+    def __intersect(self, first, second, position):
+        while first != second:
+            while position[first] > position[second]:
+                first = self.idom[first]
+            while position[second] > position[first]:
+                second = self.idom[second]
+        return first
+
+    def dominates(self, dominator, label):
+        while True:
+            if label == dominator:
+                return True
+            if self.idom[label] == label:
+                return False
+            label = self.idom[label]
+
+    def frontiers(self):
+        frontiers = {label: set() for label in self.order}
+        for label in self.order:
+            predecessors = [p for p in self.predecessors[label] if p in self.idom]
+            if len(predecessors) < 2:
+                continue
+            for predecessor in predecessors:
+                runner = predecessor
+                while runner != self.idom[label]:
+                    frontiers[runner].add(label)
+                    runner = self.idom[runner]
+        return frontiers
+
+    def natural_loops(self):
+        """Returns [(header, set of blocks)], inner loops before outer ones."""
+        loops = dict()
+        for label in self.order:
+            for predecessor in self.predecessors[label]:
+                if predecessor in self.idom and self.dominates(label, predecessor):
+                    body = loops.setdefault(label, {label})
+                    stack = [predecessor]
+                    while stack:
+                        block = stack.pop()
+                        if block not in body:
+                            body.add(block)
+                            stack.extend(
+                                p for p in self.predecessors[block] if p in self.idom
+                            )
+        return sorted(loops.items(), key=lambda loop: len(loop[1]))
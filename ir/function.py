@@ -0,0 +1,256 @@
+import re
+
+value_pattern = re.compile(r"%[-\w$.]+")
+numbered_value_pattern = re.compile(r"(?<![\w%])%(\d+)(?![-\w$.])")
+definition_pattern = re.compile(r"^\s*(%[-\w$.]+)\s*=\s*(.*)$")
+label_pattern = re.compile(r"^([-\w$.]+):$")
+successor_pattern = re.compile(r"label %([-\w$.]+)")
+terminators = ("br ", "ret ", "switch ", "unreachable")
+
+
+def definition(instruction):
+    """Returns the name defined by the instruction or None."""
+    match = definition_pattern.match(instruction)
+    return match.group(1) if match else None
+
+
+def operation(instruction):
+    """Returns the instruction without the '%name = ' part."""
+    match = definition_pattern.match(instruction)
+    return match.group(2) if match else instruction.strip()
+
+
+def opcode(instruction):
+    return operation(instruction).split(" ", 1)[0]
+
+
+def value_matches(text, is_phi=False):
+    """Yields matches of values in the text, skipping block labels."""
+    for match in value_pattern.finditer(text):
+        if text[max(0, match.start() - 6) : match.start()] == "label ":
+            continue
+        if is_phi and text[match.end() :].lstrip().startswith("]"):
+            continue
+        yield match
+
+
+def uses(instruction):
+    """Returns values used by the instruction, in order of appearance."""
+    text = operation(instruction)
+    is_phi = text.startswith("phi ")
+    return [match.group(0) for match in value_matches(text, is_phi)]
+
+
+def replace_values(instruction, replacements: dict):
+    """Substitutes used values, the defined name is left untouched."""
+    name = definition(instruction)
+    text = operation(instruction)
+    is_phi = text.startswith("phi ")
+    pieces = []
+    position = 0
+    for match in value_matches(text, is_phi):
+        pieces.append(text[position : match.start()])
+        pieces.append(replacements.get(match.group(0), match.group(0)))
+        position = match.end()
+    pieces.append(text[position:])
+    text = "".join(pieces)
+    return f"{name} = {text}" if name else text
+
+
+def is_terminator(instruction):
+    return instruction.strip().startswith(terminators)
+
+
+def has_implicit_number(instruction):
+    # Calls that return a value get a number even when it is not named
+    text = instruction.strip()
+    return (
+        definition(instruction) is None
+        and (text.startswith("call ") or text.startswith("tail call "))
+        and not text.split("call ", 1)[1].startswith("void")
+    )
+
+
+class BasicBlock(object):
+    def __init__(self, label) -> None:
+        self.label = label
+        self.instructions = []
+
+    def terminator(self):
+        if self.instructions and is_terminator(self.instructions[-1]):
+            return self.instructions[-1]
+        return None
+
+    def successors(self):
+        terminator = self.terminator()
+        if not terminator:
+            return []
+        successors = []
+        for label in successor_pattern.findall(terminator):
+            if label not in successors:
+                successors.append(label)
+        return successors
+
+    def phis(self):
+        return [inst for inst in self.instructions if opcode(inst) == "phi"]
+
+
+class Function(object):
+    """Control flow graph of a function body emitted by the code generator.
+
+    The body is a list of instruction lines and 'label:' lines, as produced
+    by write_code. The first block is named 'entry' when it has no label.
+    """
+
+    def __init__(self, body_lines: list) -> None:
+        self.blocks = []
+        self.next_value = None
+        block = BasicBlock("entry")
+        for line in body_lines:
+            match = label_pattern.match(line.strip())
+            if match:
+                if block.instructions or block.label != "entry" or self.blocks:
+                    self.blocks.append(block)
+                block = BasicBlock(match.group(1))
+            elif line.strip():
+                if block.terminator():
+                    # Code after a terminator starts a new unnamed block
+                    self.blocks.append(block)
+                    block = BasicBlock(f"dead{len(self.blocks)}")
+                block.instructions.append(line.strip())
+        self.blocks.append(block)
+
+    def block(self, label):
+        for block in self.blocks:
+            if block.label == label:
+                return block
+        return None
+
+    def entry(self):
+        return self.blocks[0]
+
+    def predecessors(self):
+        predecessors = {block.label: [] for block in self.blocks}
+        for block in self.blocks:
+            for successor in block.successors():
+                if successor in predecessors:
+                    predecessors[successor].append(block.label)
+        return predecessors
+
+    def reverse_postorder(self):
+        visited = set()
+        order = []
+        blocks = {block.label: block for block in self.blocks}
+        stack = [(self.entry().label, iter(self.entry().successors()))]
+        visited.add(self.entry().label)
+        while stack:
+            label, successors = stack[-1]
+            for successor in successors:
+                if successor not in visited and successor in blocks:
+                    visited.add(successor)
+                    stack.append((successor, iter(blocks[successor].successors())))
+                    break
+            else:
+                order.append(label)
+                stack.pop()
+        order.reverse()
+        return order
+
+    def remove_unreachable_blocks(self):
+        reachable = set(self.reverse_postorder())
+        removed = [block.label for block in self.blocks if block.label not in reachable]
+        self.blocks = [block for block in self.blocks if block.label in reachable]
+        if removed:
+            for block in self.blocks:
+                for i, inst in enumerate(block.instructions):
+                    if opcode(inst) == "phi":
+                        block.instructions[i] = remove_phi_incoming(inst, removed)
+        return len(removed)
+
+    def replace_values(self, replacements: dict):
+        if not replacements:
+            return
+        for block in self.blocks:
+            block.instructions = [
+                replace_values(inst, replacements) for inst in block.instructions
+            ]
+
+    def use_counts(self):
+        counts = dict()
+        for block in self.blocks:
+            for inst in block.instructions:
+                for value in uses(inst):
+                    counts[value] = counts.get(value, 0) + 1
+        return counts
+
+    def renumber(self):
+        """Numbers unnamed values consecutively, as LLVM requires."""
+        for block in self.blocks:
+            for i, inst in enumerate(block.instructions):
+                if has_implicit_number(inst):
+                    block.instructions[i] = f"{self.new_value()} = {inst}"
+        numbers = dict()
+        for block in self.blocks:
+            for inst in block.instructions:
+                name = definition(inst)
+                if name and numbered_value_pattern.fullmatch(name):
+                    numbers[name] = f"%{len(numbers)}"
+        for block in self.blocks:
+            for i, inst in enumerate(block.instructions):
+                inst = replace_values(inst, numbers)
+                name = definition(inst)
+                if name in numbers:
+                    inst = f"{numbers[name]} = {operation(inst)}"
+                block.instructions[i] = inst
+        self.next_value = None
+
+    def new_value(self):
+        """Returns an unused numbered value, renumber() puts it in order."""
+        if self.next_value is None:
+            self.next_value = 1
+            for block in self.blocks:
+                for inst in block.instructions:
+                    for number in numbered_value_pattern.findall(inst):
+                        self.next_value = max(self.next_value, int(number) + 1)
+        self.next_value += 1
+        return f"%{self.next_value - 1}"
+
+    def to_lines(self):
+        self.renumber()
+        lines = []
+        for block in self.blocks:
+            lines.append(f"{block.label}:")
+            lines.extend(block.instructions)
+        return lines
+
+
+phi_incoming_pattern = re.compile(r"\[\s*([^,\]]+?)\s*,\s*%([-\w$.]+)\s*\]")
+
+
+def phi_incoming(instruction):
+    """Returns [(value, label)] pairs of a phi instruction."""
+    return phi_incoming_pattern.findall(operation(instruction))
+
+
+def build_phi(name, value_type, incoming):
+    pairs = ", ".join(f"[{value}, %{label}]" for value, label in incoming)
+    return f"{name} = phi {value_type} {pairs}"
+
+
+def phi_type(instruction):
+    return re.match(r"phi\s+([^\s\[]+)", operation(instruction)).group(1)
+
+
+def remove_phi_incoming(instruction, labels):
+    incoming = [
+        (value, label) for value, label in phi_incoming(instruction) if label not in labels
+    ]
+    return build_phi(definition(instruction), phi_type(instruction), incoming)
+
+
+def rename_phi_incoming(instruction, old_label, new_label):
+    incoming = [
+        (value, new_label if label == old_label else label)
+        for value, label in phi_incoming(instruction)
+    ]
+    return build_phi(definition(instruction), phi_type(instruction), incoming)
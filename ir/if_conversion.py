@@ -0,0 +1,120 @@
+import re
+
+from .function import (
+    Function,
+    build_phi,
+    definition,
+    opcode,
+    phi_incoming,
+    phi_type,
+)
+from .licm import can_speculate
+from .simplify_cfg import merge_blocks
+
+# Instructions a branch arm may have and still be computed unconditionally
+speculation_limit = 4
+branch_pattern = re.compile(r"^br i1 ([^,]+), label %([-\w$.]+), label %([-\w$.]+)$")
+jump_pattern = re.compile(r"^br label %([-\w$.]+)$")
+
+
+def convert_branches_to_selects(function: Function):
+    """Replaces small if/else diamonds and one-armed ifs with selects.
+
+    Both arms of the branch must only compute values, without traps or
+    memory accesses, and join in the same block. Their instructions move
+    into the branching block and every phi of the join becomes a select on
+    the branch condition. Returns the number of removed branches.
+    """
+    converted = 0
+    changed = True
+    while changed:
+        changed = False
+        for block in function.blocks:
+            if convert_branch(function, block):
+                converted += 1
+                changed = True
+                break
+        if changed:
+            merge_blocks(function)
+    return converted
+
+
+def convert_branch(function: Function, block):
+    terminator = block.terminator()
+    branch = branch_pattern.match(terminator) if terminator else None
+    if not branch:
+        return False
+    condition, true_label, false_label = branch.groups()
+    if true_label == false_label:
+        return False
+    predecessors = function.predecessors()
+
+    def arm(label):
+        """Returns (instructions, join label) of an arm that can be executed
+        unconditionally, or (None, None)."""
+        arm_block = function.block(label)
+        if not arm_block or predecessors[label] != [block.label]:
+            return None, None
+        jump = jump_pattern.match(arm_block.instructions[-1])
+        body = arm_block.instructions[:-1]
+        if (
+            not jump
+            or len(body) > speculation_limit
+            or not all(can_speculate(inst) for inst in body)
+        ):
+            return None, None
+        return body, jump.group(1)
+
+    true_body, true_join = arm(true_label)
+    false_body, false_join = arm(false_label)
+    if true_body is not None and false_body is not None:
+        # Diamond: both arms jump to the same block
+        if true_join != false_join or block.label in predecessors[true_join]:
+            return False
+        join, true_source, false_source = true_join, true_label, false_label
+        body = true_body + false_body
+        removed = [true_label, false_label]
+    elif true_body is not None and true_join == false_label:
+        # Triangle: if without else
+        join, true_source, false_source = false_label, true_label, block.label
+        body = true_body
+        removed = [true_label]
+    elif false_body is not None and false_join == true_label:
+        join, true_source, false_source = true_label, block.label, false_label
+        body = false_body
+        removed = [false_label]
+    else:
+        return False
+    join_block = function.block(join)
+    if join == block.label or join_block is function.entry():
+        return False
+
+    selects = []
+    instructions = []
+    for inst in join_block.instructions:
+        if opcode(inst) == "phi":
+            incoming = dict((label, value) for value, label in phi_incoming(inst))
+            true_value = incoming[true_source]
+            false_value = incoming[false_source]
+            value_type = phi_type(inst)
+            if true_value == false_value:
+                value = true_value
+            else:
+                value = function.new_value()
+                selects.append(
+                    f"{value} = select i1 {condition}, {value_type} {true_value},"
+                    f" {value_type} {false_value}"
+                )
+            others = [
+                (v, label)
+                for v, label in phi_incoming(inst)
+                if label not in [true_source, false_source]
+            ]
+            inst = build_phi(
+                definition(inst), value_type, [(value, block.label)] + others
+            )
+        instructions.append(inst)
+    join_block.instructions = instructions
+    block.instructions = block.instructions[:-1] + body + selects + [f"br label %{join}"]
+    function.blocks = [b for b in function.blocks if b.label not in removed]
+    return True
@@ -0,0 +1,163 @@
+import re
+
+from .dominance import DominatorTree
+from .function import (
+    BasicBlock,
+    Function,
+    build_phi,
+    definition,
+    opcode,
+    operation,
+    phi_incoming,
+    phi_type,
+    uses,
+)
+from .value_numbering import pure_opcodes
+
+trapping_opcodes = ["sdiv", "udiv", "srem"]
+divisor_pattern = re.compile(r", (-?\d+)$")
+pointer_argument_pattern = re.compile(r"\*\s+(?:align \d+\s+)?(%[-\w$.]+)")
+# Calls that do not write memory through their pointer arguments
+readonly_callees = [
+    "@llvm.stacksave",
+    "@llvm.stackrestore",
+    "@__majan_write_bytes",
+    "@__majan_write_string",
+]
+
+
+def can_speculate(instruction):
+    """Returns True for pure instructions that cannot trap, so they may run
+    on paths that do not need their result. Division is only safe by a
+    constant other than 0 and -1.
+    """
+    if opcode(instruction) in trapping_opcodes:
+        divisor = divisor_pattern.search(operation(instruction))
+        return bool(divisor) and int(divisor.group(1)) not in [0, -1]
+    return opcode(instruction) in pure_opcodes
+
+
+def hoist_loop_invariants(function: Function):
+    """Moves instructions that compute the same value on every iteration of
+    a loop into the loop preheader. Returns the number of moved instructions.
+    """
+    hoisted = 0
+    headers = [header for header, _ in DominatorTree(function).natural_loops()]
+    for header in headers:
+        tree = DominatorTree(function)
+        body = dict(tree.natural_loops())[header]
+        preheader = find_or_create_preheader(function, tree, header, body)
+        if preheader:
+            hoisted += hoist_from_loop(function, preheader, body)
+    return hoisted
+
+
+def find_or_create_preheader(function: Function, tree, header, body):
+    outside = [p for p in tree.predecessors[header] if p not in body]
+    if not outside:
+        return None
+    if len(outside) == 1 and function.block(outside[0]).successors() == [header]:
+        return function.block(outside[0])
+    # Every edge into the loop is moved to a new block, e.g. the edges from
+    # the blocks of a short-circuit loop test. Phis of the header that take
+    # different values from them get a phi in the new block.
+    preheader = BasicBlock(f"{header}.preheader")
+    for label in outside:
+        predecessor = function.block(label)
+        predecessor.instructions[-1] = re.sub(
+            rf"label %{re.escape(header)}(?![-\w$.])",
+            f"label %{preheader.label}",
+            predecessor.instructions[-1],
+        )
+    header_block = function.block(header)
+    instructions = []
+    for inst in header_block.instructions:
+        if opcode(inst) == "phi":
+            incoming = phi_incoming(inst)
+            entering = [(value, label) for value, label in incoming if label in outside]
+            value = entering[0][0]
+            if len(set(value for value, _ in entering)) > 1:
+                value = f"{definition(inst)}.preheader"
+                preheader.instructions.append(
+                    build_phi(value, phi_type(inst), entering)
+                )
+            incoming = [(v, label) for v, label in incoming if label not in outside]
+            inst = build_phi(
+                definition(inst), phi_type(inst), [(value, preheader.label)] + incoming
+            )
+        instructions.append(inst)
+    header_block.instructions = instructions
+    preheader.instructions.append(f"br label %{header}")
+    function.blocks.insert(function.blocks.index(header_block), preheader)
+    return preheader
+
+
+def hoist_from_loop(function: Function, preheader, body):
+    loop_blocks = [block for block in function.blocks if block.label in body]
+    defined_in_loop = set()
+    definitions = dict()
+    for block in function.blocks:
+        for inst in block.instructions:
+            if definition(inst):
+                definitions[definition(inst)] = inst
+
+    def base_address(value):
+        while value in definitions and opcode(definitions[value]) in [
+            "bitcast",
+            "getelementptr",
+        ]:
+            value = uses(definitions[value])[0]
+        return value
+
+    def is_alloca(value):
+        return value in definitions and opcode(definitions[value]) == "alloca"
+
+    # Stack slots the loop may write: stored to or passed to a call. A write
+    # through any other pointer makes every load in the loop variant.
+    written = set()
+    writes_unknown_memory = False
+    for block in loop_blocks:
+        for inst in block.instructions:
+            if definition(inst):
+                defined_in_loop.add(definition(inst))
+            if opcode(inst) == "store":
+                address = base_address(uses(inst)[-1])
+                written.add(address)
+                writes_unknown_memory |= not is_alloca(address)
+            if opcode(inst) in ["call", "tail"] and not any(
+                f"{callee}(" in inst for callee in readonly_callees
+            ):
+                for pointer in pointer_argument_pattern.findall(operation(inst)):
+                    address = base_address(pointer)
+                    written.add(address)
+                    writes_unknown_memory |= not is_alloca(address)
+
+    def can_hoist(inst):
+        code = opcode(inst)
+        if code in pure_opcodes:
+            return can_speculate(inst)
+        if code == "load":
+            address = base_address(uses(inst)[0])
+            return (
+                is_alloca(address)
+                and address not in written
+                and not writes_unknown_memory
+            )
+        return False
+
+    hoisted = 0
+    changed = True
+    while changed:
+        changed = False
+        for block in loop_blocks:
+            kept = []
+            for inst in block.instructions:
+                if can_hoist(inst) and not set(uses(inst)) & defined_in_loop:
+                    preheader.instructions.insert(-1, inst)
+                    defined_in_loop.discard(definition(inst))
+                    hoisted += 1
+                    changed = True
+                else:
+                    kept.append(inst)
+            block.instructions = kept
+    return hoisted
@@ -0,0 +1,176 @@
+import re
+
+from .dominance import DominatorTree
+from .function import (
+    Function,
+    build_phi,
+    definition,
+    opcode,
+    operation,
+    phi_incoming,
+    uses,
+)
+
+promotable_types = ["i32", "double", "i1", "%string"]
+alloca_pattern = re.compile(r"alloca ([^,\s]+)")
+load_pattern = re.compile(r"load ([^,\s]+), ([^,\s]+)\* (%[-\w$.]+)")
+store_pattern = re.compile(r"store ([^,\s]+) ([^,]+), ([^,\s]+)\* (%[-\w$.]+)")
+
+
+def find_promotable_allocas(function: Function):
+    """Returns {alloca: type} for scalars that are only loaded and stored."""
+    allocas = dict()
+    for block in function.blocks:
+        for inst in block.instructions:
+            match = alloca_pattern.fullmatch(operation(inst).split(",")[0])
+            if opcode(inst) == "alloca" and match:
+                if match.group(1) in promotable_types:
+                    allocas[definition(inst)] = match.group(1)
+    for block in function.blocks:
+        for inst in block.instructions:
+            for value in uses(inst):
+                if value not in allocas:
+                    continue
+                load = load_pattern.match(operation(inst))
+                store = store_pattern.match(operation(inst))
+                if load and load.group(3) == value:
+                    continue
+                if store and store.group(4) == value and store.group(2) != value:
+                    continue
+                # The address escapes, e.g. it is passed to a call
+                del allocas[value]
+    return allocas
+
+
+def promote_memory_to_registers(function: Function):
+    """Replaces loads and stores of scalar variables with SSA values.
+
+    Phi nodes are placed on the iterated dominance frontier of the blocks
+    that assign a variable, which puts them at if joins and while headers.
+    Returns the number of promoted variables.
+    """
+    function.remove_unreachable_blocks()
+    allocas = find_promotable_allocas(function)
+    if not allocas:
+        return 0
+    tree = DominatorTree(function)
+    frontiers = tree.frontiers()
+    blocks = {block.label: block for block in function.blocks}
+
+    phis = dict()  # phi name -> variable
+    for variable in allocas:
+        defining_blocks = [
+            block.label
+            for block in function.blocks
+            if any(defines_variable(inst, variable) for inst in block.instructions)
+        ]
+        has_phi = set()
+        worklist = list(defining_blocks)
+        while worklist:
+            label = worklist.pop()
+            for frontier in frontiers[label]:
+                if frontier in has_phi:
+                    continue
+                has_phi.add(frontier)
+                name = function.new_value()
+                phis[name] = variable
+                blocks[frontier].instructions.insert(
+                    0, build_phi(name, allocas[variable], [])
+                )
+                if frontier not in defining_blocks:
+                    worklist.append(frontier)
+
+    replacements = dict()
+    incoming = {name: [] for name in phis}
+    stacks = {variable: ["undef"] for variable in allocas}
+
+    def current(value):
+        while value in replacements:
+            value = replacements[value]
+        return value
+
+    # Renaming walks the dominator tree, pushing the reaching definition
+    # of every variable and popping it when leaving the subtree
+    depths = dict()
+    work = [(tree.order[0], False)]
+    while work:
+        label, leaving = work.pop()
+        block = blocks[label]
+        if leaving:
+            for variable, depth in depths[label].items():
+                del stacks[variable][depth:]
+            continue
+        depths[label] = {variable: len(stacks[variable]) for variable in allocas}
+        instructions = []
+        for inst in block.instructions:
+            name = definition(inst)
+            text = operation(inst)
+            if name in phis:
+                stacks[phis[name]].append(name)
+                instructions.append(inst)
+                continue
+            load = load_pattern.match(text)
+            store = store_pattern.match(text)
+            if name in allocas:
+                stacks[name].append("undef")
+            elif load and opcode(inst) == "load" and load.group(3) in allocas:
+                replacements[name] = stacks[load.group(3)][-1]
+            elif store and opcode(inst) == "store" and store.group(4) in allocas:
+                stacks[store.group(4)].append(store.group(2).strip())
+            else:
+                instructions.append(inst)
+        block.instructions = instructions
+        for successor in block.successors():
+            for inst in blocks[successor].phis():
+                if definition(inst) in phis:
+                    variable = phis[definition(inst)]
+                    incoming[definition(inst)].append((stacks[variable][-1], label))
+        work.append((label, True))
+        for child in reversed(tree.children[label]):
+            work.append((child, False))
+
+    for block in function.blocks:
+        for i, inst in enumerate(block.instructions):
+            name = definition(inst)
+            if name in phis:
+                pairs = [(current(value), pred) for value, pred in incoming[name]]
+                block.instructions[i] = build_phi(name, allocas[phis[name]], pairs)
+    function.replace_values({value: current(value) for value in replacements})
+    remove_useless_phis(function)
+    return len(allocas)
+
+
+def defines_variable(instruction, variable):
+    if definition(instruction) == variable:
+        return True
+    store = store_pattern.match(operation(instruction))
+    return bool(store and opcode(instruction) == "store" and store.group(4) == variable)
+
+
+def remove_useless_phis(function: Function):
+    """Drops phis without uses and phis that always get the same value."""
+    changed = True
+    while changed:
+        changed = False
+        counts = function.use_counts()
+        replacements = dict()
+        for block in function.blocks:
+            kept = []
+            for inst in block.instructions:
+                name = definition(inst)
+                if opcode(inst) != "phi":
+                    kept.append(inst)
+                    continue
+                values = {value for value, _ in phi_incoming(inst)} - {name}
+                if counts.get(name, 0) == 0:
+                    changed = True
+                elif len(values) == 1:
+                    replacements[name] = values.pop()
+                    changed = True
+                else:
+                    kept.append(inst)
+            block.instructions = kept
+        for name in replacements:
+            while replacements[name] in replacements:
+                replacements[name] = replacements[replacements[name]]
+        function.replace_values(replacements)
@@ -0,0 +1,194 @@
+import re
+
+from .function import (
+    Function,
+    build_phi,
+    definition,
+    opcode,
+    phi_incoming,
+    phi_type,
+    remove_phi_incoming,
+    rename_phi_incoming,
+    successor_pattern,
+)
+
+constant_branch_pattern = re.compile(
+    r"^br i1 (true|false|1|0), label %([-\w$.]+), label %([-\w$.]+)(.*)$"
+)
+conditional_branch_pattern = re.compile(
+    r"^br i1 [^,]+, label %([-\w$.]+), label %([-\w$.]+)(.*)$"
+)
+constant_switch_pattern = re.compile(
+    r"^switch i32 (-?\d+), label %([-\w$.]+) \[(.*)\](.*)$"
+)
+switch_case_pattern = re.compile(r"i32 (-?\d+), label %([-\w$.]+)")
+jump_pattern = re.compile(r"^br label %([-\w$.]+)$")
+
+
+def simplify_control_flow(function: Function):
+    """Folds branches on constants, threads jumps through empty blocks,
+    merges a block into its only predecessor and removes unreachable
+    blocks, until nothing changes. Returns the number of removed blocks.
+    """
+    blocks_before = len(function.blocks)
+    changed = True
+    while changed:
+        function.remove_unreachable_blocks()
+        changed = fold_branches(function)
+        changed |= thread_jumps(function)
+        changed |= merge_blocks(function)
+    function.remove_unreachable_blocks()
+    return blocks_before - len(function.blocks)
+
+
+def fold_branches(function: Function):
+    """Turns branches and switches on a constant or to a single target into
+    jumps."""
+    changed = False
+    for block in function.blocks:
+        terminator = block.terminator()
+        if not terminator:
+            continue
+        constant = constant_branch_pattern.match(terminator)
+        conditional = conditional_branch_pattern.match(terminator)
+        switch = constant_switch_pattern.match(terminator)
+        if switch:
+            value, default, cases, rest = switch.groups()
+            targets = dict(
+                (int(case), label) for case, label in switch_case_pattern.findall(cases)
+            )
+            target = targets.get(int(value), default)
+            block.instructions[-1] = f"br label %{target}{rest}"
+            for label in set(targets.values()) | {default}:
+                if label != target:
+                    remove_incoming_edge(function, block.label, label)
+            changed = True
+            continue
+        if constant:
+            condition, true_label, false_label, rest = constant.groups()
+            if condition in ["true", "1"]:
+                target, dropped = true_label, false_label
+            else:
+                target, dropped = false_label, true_label
+        elif conditional and conditional.group(1) == conditional.group(2):
+            target, dropped, rest = conditional.group(1), None, conditional.group(3)
+        else:
+            continue
+        block.instructions[-1] = f"br label %{target}{rest}"
+        if dropped and dropped != target:
+            remove_incoming_edge(function, block.label, dropped)
+        changed = True
+    return changed
+
+
+def thread_jumps(function: Function):
+    """Sends the predecessors of a block that only jumps on to its target.
+
+    A predecessor that already branches to the target is left alone when
+    a phi of the target would need two different values from it. So is a
+    switch that would enter the target over more than one edge, since a
+    phi needs an entry for each of them.
+    """
+    changed = False
+    for block in function.blocks[1:]:
+        jump = (
+            jump_pattern.match(block.instructions[0])
+            if len(block.instructions) == 1
+            else None
+        )
+        if not jump or jump.group(1) == block.label:
+            continue
+        target = function.block(jump.group(1))
+        if not target:
+            continue
+        predecessors = function.predecessors()
+        for label in predecessors[block.label]:
+            if label == block.label:
+                continue
+            already_enters = label in predecessors[target.label]
+            phis = target.phis()
+            incoming = [dict((l, v) for v, l in phi_incoming(phi)) for phi in phis]
+            if already_enters and any(
+                values[label] != values[block.label] for values in incoming
+            ):
+                continue
+            predecessor = function.block(label)
+            if is_switch(predecessor) and (
+                already_enters or edge_count(predecessor, block.label) > 1
+            ):
+                continue
+            predecessor.instructions[-1] = re.sub(
+                rf"label %{re.escape(block.label)}(?![-\w$.])",
+                f"label %{target.label}",
+                predecessor.instructions[-1],
+            )
+            if not already_enters:
+                for i, inst in enumerate(target.instructions):
+                    if opcode(inst) != "phi":
+                        break
+                    pairs = phi_incoming(inst)
+                    value = dict((l, v) for v, l in pairs)[block.label]
+                    target.instructions[i] = build_phi(
+                        definition(inst), phi_type(inst), pairs + [(value, label)]
+                    )
+            changed = True
+    return changed
+
+
+def merge_blocks(function: Function):
+    """Appends a block to its predecessor if they only have each other."""
+    changed = False
+    predecessors = function.predecessors()
+    for block in list(function.blocks):
+        if block not in function.blocks:
+            continue
+        terminator = block.terminator()
+        jump = jump_pattern.match(terminator) if terminator else None
+        if not jump or jump.group(1) == block.label:
+            continue
+        successor = function.block(jump.group(1))
+        if (
+            not successor
+            or successor is function.entry()
+            or predecessors[successor.label] != [block.label]
+        ):
+            continue
+        replacements = dict()
+        instructions = []
+        for inst in successor.instructions:
+            if opcode(inst) == "phi":
+                replacements[definition(inst)] = phi_incoming(inst)[0][0]
+            else:
+                instructions.append(inst)
+        block.instructions = block.instructions[:-1] + instructions
+        function.blocks.remove(successor)
+        for label in block.successors():
+            following = function.block(label)
+            following.instructions = [
+                rename_phi_incoming(inst, successor.label, block.label)
+                if opcode(inst) == "phi"
+                else inst
+                for inst in following.instructions
+            ]
+        function.replace_values(replacements)
+        predecessors = function.predecessors()
+        changed = True
+    return changed
+
+
+def remove_incoming_edge(function: Function, source, target):
+    block = function.block(target)
+    if not block:
+        return
+    block.instructions = [
+        remove_phi_incoming(inst, [source]) if opcode(inst) == "phi" else inst
+        for inst in block.instructions
+    ]
+
+
+def is_switch(block):
+    return opcode(block.terminator()) == "switch"
+
+
+def edge_count(block, label):
+    return successor_pattern.findall(block.terminator()).count(label)
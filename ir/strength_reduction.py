@@ -0,0 +1,158 @@
+import re
+
+from .function import Function, definition, operation
+
+# Operations on two constants are left to LLVM to fold
+constant_operation_pattern = re.compile(
+    r"^(mul|sdiv)((?: nsw| nuw| exact)*) i32 (%[-\w$.]+), (-?\d+)$"
+)
+constant_first_pattern = re.compile(r"^mul((?: nsw| nuw)*) i32 (-?\d+), (%[-\w$.]+)$")
+
+
+def reduce_strength(function: Function):
+    """Replaces int multiplications and divisions by constants with cheaper
+    instructions: shifts for powers of two, a shift and an add or sub for
+    multipliers next to them, and a multiplication by a magic number for
+    other divisors. Returns the number of replaced instructions.
+    """
+    reduced = 0
+    for block in function.blocks:
+        instructions = []
+        for inst in block.instructions:
+            name = definition(inst)
+            text = operation(inst)
+            match = constant_operation_pattern.match(text)
+            swapped = constant_first_pattern.match(text)
+            replacement = None
+            if match:
+                code, _, value, constant = match.groups()
+                if code == "mul":
+                    replacement = multiply(function, name, value, int(constant))
+                else:
+                    replacement = divide(function, name, value, int(constant))
+            elif swapped:
+                _, constant, value = swapped.groups()
+                replacement = multiply(function, name, value, int(constant))
+            if replacement:
+                instructions.extend(replacement)
+                reduced += 1
+            else:
+                instructions.append(inst)
+        block.instructions = instructions
+    return reduced
+
+
+def shift_and_add(multiplier):
+    """Returns (add_shift, op, shift) such that multiplier is
+    ((1 << add_shift) op 1) << shift, op being None for a power of two.
+    """
+    shift = 0
+    while multiplier % 2 == 0:
+        multiplier //= 2
+        shift += 1
+    if multiplier == 1:
+        return 0, None, shift
+    if (multiplier - 1) & (multiplier - 2) == 0:
+        return (multiplier - 1).bit_length() - 1, "add", shift
+    if (multiplier + 1) & multiplier == 0:
+        return (multiplier + 1).bit_length() - 1, "sub", shift
+    return None
+
+
+def multiply(function: Function, name, value, constant):
+    if constant in [0, 1] or constant < -(2**31) or constant >= 2**31:
+        return None
+    decomposition = shift_and_add(abs(constant))
+    if not decomposition:
+        return None
+    add_shift, op, shift = decomposition
+    lines = []
+
+    def emit(text):
+        result = function.new_value()
+        lines.append(f"{result} = {text}")
+        return result
+
+    # Ints wrap around, so x * c is the same as -(x * -c)
+    result = value
+    if op:
+        shifted = emit(f"shl i32 {value}, {add_shift}")
+        result = emit(f"{op} i32 {shifted}, {value}")
+    if shift:
+        result = emit(f"shl i32 {result}, {shift}")
+    if constant < 0:
+        result = emit(f"sub i32 0, {result}")
+    return rename_result(lines, name)
+
+
+def magic_number(divisor):
+    """Returns (multiplier, shift) for 2 <= divisor < 2**31: for every i32 x
+    the quotient rounded down is x * multiplier >> (32 + shift), see Hacker's
+    Delight, section 10-4. The multiplier is below 2**32.
+    """
+    two31 = 2**31
+    anc = two31 - 1 - two31 % divisor
+    p = 31
+    q1, r1 = divmod(two31, anc)
+    q2, r2 = divmod(two31, divisor)
+    while True:
+        p += 1
+        q1, r1 = 2 * q1, 2 * r1
+        if r1 >= anc:
+            q1, r1 = q1 + 1, r1 - anc
+        q2, r2 = 2 * q2, 2 * r2
+        if r2 >= divisor:
+            q2, r2 = q2 + 1, r2 - divisor
+        delta = divisor - r2
+        if not (q1 < delta or (q1 == delta and r1 == 0)):
+            break
+    return q2 + 1, p - 32
+
+
+def divide(function: Function, name, value, constant):
+    # x / 1 is left to the simplifier, x / -2**31 has no positive divisor
+    if constant in [0, 1] or constant <= -(2**31) or constant >= 2**31:
+        return None
+    divisor = abs(constant)
+    lines = []
+
+    def emit(text):
+        result = function.new_value()
+        lines.append(f"{result} = {text}")
+        return result
+
+    # Unlike the program's own arithmetic none of these can overflow: the
+    # bias only moves negative values up, the product of an i32 and a
+    # multiplier below 2**32 fits in i64 and a quotient by 2 or more is
+    # never -2**31. For x / -1 the negated value is x itself, which is.
+    if divisor == 1:
+        result = value
+    elif divisor & (divisor - 1) == 0:
+        # sdiv rounds towards zero, a shift rounds down, so negative values
+        # are moved up by divisor - 1 first
+        shift = divisor.bit_length() - 1
+        sign = value
+        if shift > 1:
+            sign = emit(f"ashr i32 {value}, 31")
+        bias = emit(f"lshr i32 {sign}, {32 - shift}")
+        biased = emit(f"add nsw i32 {value}, {bias}")
+        result = emit(f"ashr i32 {biased}, {shift}")
+    else:
+        multiplier, shift = magic_number(divisor)
+        wide = emit(f"sext i32 {value} to i64")
+        product = emit(f"mul nsw i64 {wide}, {multiplier}")
+        high = emit(f"ashr i64 {product}, {32 + shift}")
+        quotient = emit(f"trunc i64 {high} to i32")
+        # The product rounds down, negative values need one more
+        sign = emit(f"lshr i32 {value}, 31")
+        result = emit(f"add nsw i32 {quotient}, {sign}")
+    if constant < 0:
+        flags = " nsw" if divisor > 1 else ""
+        result = emit(f"sub{flags} i32 0, {result}")
+    return rename_result(lines, name)
+
+
+def rename_result(lines, name):
+    """The last line defines the value of the replaced instruction."""
+    lines[-1] = f"{name} = {operation(lines[-1])}"
+    return lines
@@ -0,0 +1,102 @@
+import re
+
+from .function import Function, definition, opcode, operation, replace_values
+from .mem2reg import load_pattern, store_pattern
+
+pure_opcodes = [
+    "add",
+    "sub",
+    "mul",
+    "sdiv",
+    "udiv",
+    "srem",
+    "shl",
+    "ashr",
+    "lshr",
+    "and",
+    "or",
+    "xor",
+    "fadd",
+    "fsub",
+    "fmul",
+    "fdiv",
+    "fneg",
+    "icmp",
+    "fcmp",
+    "sitofp",
+    "fptosi",
+    "trunc",
+    "zext",
+    "sext",
+    "bitcast",
+    "getelementptr",
+    "select",
+    "extractvalue",
+    "insertvalue",
+]
+commutative_opcodes = ["add", "mul", "and", "or", "xor", "fadd", "fmul"]
+commutative_predicates = ["eq", "ne", "oeq", "one", "ueq", "une"]
+binary_pattern = re.compile(r"^(\w+)((?: \w+)*) ([^\s,]+) ([^\s,]+)\s*,\s*([^\s,]+)$")
+
+
+def expression_key(text):
+    """Returns the text of a pure operation with commutative operands sorted."""
+    text = " ".join(text.replace(" ,", ",").split())
+    match = binary_pattern.match(text)
+    if not match:
+        return text
+    name, modifiers, value_type, left, right = match.groups()
+    commutative = name in commutative_opcodes or (
+        name in ["icmp", "fcmp"] and modifiers.split()[-1] in commutative_predicates
+    )
+    if commutative and right < left:
+        left, right = right, left
+    return f"{name}{modifiers} {value_type} {left}, {right}"
+
+
+def number_values_locally(function: Function):
+    """Reuses values computed earlier in the same basic block.
+
+    Pure operations with the same opcode and operands are computed once.
+    Loads are reused until the next store or call, and a load right after
+    a store to the same address takes the stored value. Returns the number
+    of removed instructions.
+    """
+    replacements = dict()
+    removed = 0
+    for block in function.blocks:
+        expressions = dict()
+        loads = dict()
+        instructions = []
+        for inst in block.instructions:
+            inst = replace_values(inst, replacements)
+            name = definition(inst)
+            text = operation(inst)
+            code = opcode(inst)
+            load = load_pattern.match(text)
+            if code == "load" and load:
+                key = (load.group(1), load.group(3))
+                if key in loads:
+                    replacements[name] = loads[key]
+                    removed += 1
+                    continue
+                loads[key] = name
+            elif code == "store":
+                loads.clear()
+                store = store_pattern.match(text)
+                if store:
+                    loads[(store.group(1), store.group(4))] = store.group(2).strip()
+            elif code in ["call", "tail"]:
+                # Calls may write memory, e.g. memcpy
+                loads.clear()
+            elif code in pure_opcodes and name:
+                key = expression_key(text)
+                if key in expressions:
+                    replacements[name] = expressions[key]
+                    removed += 1
+                    continue
+                expressions[key] = name
+            instructions.append(inst)
+        block.instructions = instructions
+    function.replace_values(replacements)
+    return removed
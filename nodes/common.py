@@ -1,5 +1,18 @@
+import platform
+import struct
 from enum import Enum
 
+from ir import (
+    Function,
+    promote_memory_to_registers,
+    number_values_locally,
+    hoist_loop_invariants,
+    simplify_control_flow,
+    convert_branches_to_selects,
+    reduce_strength,
+)
+from .runtime import runtime_functions, runtime_dependencies
+
 
 class ProgramMemory(object):
     string_count = 0
@@ -7,8 +20,38 @@ class ProgramMemory(object):
     labels_count = 1
     variables_dict = dict()
     header_lines = []
+    metadata_lines = []
     str_alias = 1
-    buffer_size = 16
+    string_literals = dict()
+    string_constants = dict()
+    known_strings = dict()
+    entry_lines = []
+    stack_pointer = None
+    string_builders = set()
+    string_owners = set()
+    used_runtime_functions = set()
+    current_block = "entry"
+    partial_evaluation = True
+    dead_code_elimination = True
+    dead_store_elimination = True
+    algebraic_simplification = True
+    fast_math = False
+    no_signed_wrap = True
+    register_promotion = True
+    value_numbering = True
+    loop_invariant_code_motion = True
+    control_flow_simplification = True
+    if_conversion = True
+    strength_reduction = True
+    switch_lowering = True
+    string_folding = True
+    write_merging = True
+    conversion_caching = True
+    converted_values = dict()
+    converted_block = None
+    optimization_statistics = dict()
+    evaluation_fuel = 100000
+    evaluation_bytes = 1 << 24
 
     @classmethod
     def increment_and_read_mem(cls):
@@ -20,6 +63,214 @@ class ProgramMemory(object):
         cls.labels_count += 1
         return cls.labels_count - 1
 
+    @classmethod
+    def allocate_string_buffer(cls, output_lines, size, escapes):
+        """Emits a pointer to a buffer of size bytes and returns its mem id.
+
+        Size is an i64 value computed at runtime. A buffer that escapes into
+        a variable comes from the heap, a stack buffer inside a loop would
+        be overwritten on the next iteration while still in use. Buffers
+        that do not escape are statement temporaries, the stack is restored
+        once the statement is done, so loops run in constant stack space.
+        """
+        if escapes:
+            output_lines.append(f"%{cls.mem_counter} = call i8* @malloc(i64 {size})")
+            return cls.increment_and_read_mem()
+        if cls.stack_pointer is None:
+            cls.stack_pointer = cls.increment_and_read_mem()
+            output_lines.append(
+                f"%{cls.stack_pointer} = call i8* @llvm.stacksave()"
+            )
+        output_lines.append(f"%{cls.mem_counter} = alloca i8, i64 {size}")
+        return cls.increment_and_read_mem()
+
+    @classmethod
+    def release_temporaries(cls, output_lines):
+        if cls.stack_pointer is not None:
+            output_lines.append(
+                f"call void @llvm.stackrestore(i8* %{cls.stack_pointer})"
+            )
+            cls.stack_pointer = None
+
+    @classmethod
+    def convert_to_double(cls, output_lines, mem_id, val, name=None):
+        """Returns (mem_id, val) of an int value converted to a double.
+
+        A literal becomes a double constant. The conversion of a variable,
+        named by name, or of a value is reused in the rest of its block,
+        until the variable is assigned, see forget_conversion.
+        """
+        if not cls.conversion_caching:
+            value = val if val != "" else f"%{mem_id}"
+            output_lines.append(
+                f"%{cls.mem_counter} = sitofp i32 {value} to double"
+            )
+            return cls.increment_and_read_mem(), ""
+        if val != "":
+            return -1, llvm_double(float(val))
+        if cls.converted_block != cls.current_block:
+            cls.converted_values = dict()
+            cls.converted_block = cls.current_block
+        key = name if name is not None else f"%{mem_id}"
+        if key not in cls.converted_values:
+            output_lines.append(
+                f"%{cls.mem_counter} = sitofp i32 %{mem_id} to double"
+            )
+            cls.converted_values[key] = cls.increment_and_read_mem()
+        return cls.converted_values[key], ""
+
+    @classmethod
+    def forget_conversion(cls, name):
+        cls.converted_values.pop(name, None)
+
+    @classmethod
+    def intern_string(cls, value: str):
+        """Returns the name of the %string value of a literal.
+
+        Equal literals share one constant global. Nothing writes to a
+        literal, appends copy it first, so uses point straight at the
+        constant and the value is built once in the entry block.
+        """
+        if value not in cls.string_literals:
+            n, l = cls.string_constant(value)
+            cls.entry_lines.append(
+                f"%{n}.pointer = insertvalue %string undef, i8* getelementptr inbounds ([{l} x i8], [{l} x i8]* @{n}, i64 0, i64 0), 0"
+            )
+            cls.entry_lines.append(
+                f"%{n}.value = insertvalue %string %{n}.pointer, i64 {l - 1}, 1"
+            )
+            cls.string_literals[value] = f"{n}.value"
+        return cls.string_literals[value]
+
+    @classmethod
+    def string_constant(cls, value: str):
+        """Returns the global holding the characters of a literal and its
+        size, including the terminating zero.
+        """
+        if value not in cls.string_constants:
+            data = value.encode()
+            n = f"str{cls.str_alias}"
+            cls.str_alias += 1
+            cls.header_lines.append(
+                f"@{n} = private unnamed_addr constant [{len(data) + 1} x i8] {llvm_string_literal(data + bytes(1))}"
+            )
+            cls.string_constants[value] = (n, len(data) + 1)
+        return cls.string_constants[value]
+
+    @classmethod
+    def add_loop_metadata(cls):
+        """Returns a new loop id for the !llvm.loop of a back edge.
+
+        It only names the loop, loops may run forever, so there is no
+        llvm.loop.mustprogress.
+        """
+        loop_id = f"!{len(cls.metadata_lines)}"
+        cls.metadata_lines.append(f"{loop_id} = distinct !{{{loop_id}}}")
+        return loop_id
+
+    @classmethod
+    def use_runtime_function(cls, name):
+        """Adds the definition of a runtime helper to the module once."""
+        if name not in cls.used_runtime_functions:
+            cls.used_runtime_functions.add(name)
+            for dependency in runtime_dependencies.get(name, []):
+                cls.use_runtime_function(dependency)
+            cls.header_lines.extend(runtime_functions[name])
+        return name
+
+
+class EvaluationContext(object):
+    def __init__(self, fuel, byte_budget) -> None:
+        self.variables = dict()
+        self.types = dict()
+        self.output = []
+        self.fuel = fuel
+        self.byte_budget = byte_budget
+
+    def use_fuel(self):
+        self.fuel -= 1
+        return self.fuel >= 0
+
+    def use_bytes(self, count):
+        # Written and concatenated strings share the budget, so the output
+        # and the compile time stay bounded even if a loop doubles a string
+        self.byte_budget -= count
+        return self.byte_budget >= 0
+
+
+def evaluate_constant(expression):
+    """Returns (0, value) if the expression does not depend on any variable."""
+    return expression.evaluate(
+        EvaluationContext(0, ProgramMemory.evaluation_bytes)
+    )
+
+
+def wrap_int(value):
+    # MAJAN ints are i32 values, so arithmetic wraps around like in LLVM
+    return (value + 2**31) % 2**32 - 2**31
+
+
+# Data layouts of the hosts the compiler is known to run on, as LLVM 14
+# writes them, newer versions upgrade them
+host_targets = {
+    ("x86_64", "Linux"): (
+        "x86_64-pc-linux-gnu",
+        "e-m:e-p270:32:32-p271:32:32-p272:64:64-i64:64-f80:128-n8:16:32:64-S128",
+    ),
+    ("aarch64", "Linux"): (
+        "aarch64-unknown-linux-gnu",
+        "e-m:e-i8:8:32-i16:16:32-i64:64-i128:128-n32:64-S128",
+    ),
+    ("x86_64", "Darwin"): (
+        "x86_64-apple-macosx10.15.0",
+        "e-m:o-i64:64-f80:128-n8:16:32:64-S128",
+    ),
+    ("arm64", "Darwin"): (
+        "arm64-apple-macosx11.0.0",
+        "e-m:o-i64:64-i128:128-n32:64-S128",
+    ),
+}
+
+
+def target_lines():
+    """Returns the target lines of the module for the host. On other hosts
+    LLVM uses its default target.
+    """
+    target = host_targets.get((platform.machine(), platform.system()))
+    if not target:
+        return []
+    triple, layout = target
+    return [f'target datalayout = "{layout}"', f'target triple = "{triple}"', ""]
+
+
+def variable_name(node):
+    """Returns the name of a variable node, None for other expressions."""
+    return node.name if node.type == "variable" else None
+
+
+def llvm_string_literal(data: bytes):
+    escaped = ""
+    for byte in data:
+        if 32 <= byte < 127 and chr(byte) not in '"\\':
+            escaped += chr(byte)
+        else:
+            escaped += f"\\{byte:02X}"
+    return f'c"{escaped}"'
+
+
+def llvm_double(value: float):
+    """Returns the value as an LLVM double constant. LLVM does not take the
+    exponent form Python prints for very small and large values, nor inf
+    and nan, those are written as the bits of the double in hex.
+    """
+    text = repr(value)
+    if "e" in text or "n" in text:
+        return f"0x{struct.unpack('>Q', struct.pack('>d', value))[0]:016X}"
+    return text
+
+
+write_declaration = "declare i64 @write(i32, i8* nocapture readonly, i64) nounwind"
+
 
 class Types(Enum):
     Int = "int"
@@ -47,6 +298,92 @@ class Node:
             node_as_text += f"\n{indentation}Right node:\n{right_str}"
         return node_as_text
 
+    def remove_dead_code(self):
+        return [self]
+
+    def falls_through(self):
+        return True
+
+    def appended_variables(self, in_loop):
+        """Returns names of variables appended to with 'x = x + ...' in a loop."""
+        return set()
+
+    def allocated_variables(self):
+        """Returns names of variables that may be given a new heap buffer,
+        by + or read."""
+        return set()
+
+    def assigned_variables(self):
+        """Returns names of variables assigned or read into by the node."""
+        return set()
+
+    def used_variables(self):
+        """Returns names of variables the node reads or writes."""
+        names = set()
+        for child in [self.left, self.right]:
+            if child:
+                names = names | child.used_variables()
+        return names
+
+    def live_variables(self, live):
+        """Returns names of variables whose value may be read after the
+        start of the statement, given the ones live after it.
+        """
+        return live | self.used_variables()
+
+    def remove_dead_stores(self, live):
+        """Removes assignments inside the statement whose value is never
+        read, returns the variables live before it, see live_variables.
+        """
+        return self.live_variables(live)
+
+    def is_dead_store(self, live):
+        return False
+
+    def static_string(self):
+        """Returns the value of a string expression known at compile time."""
+        return None
+
+    def merge_writes(self):
+        """Joins adjacent writes into one node, see Write.write_code."""
+        pass
+
+    def simplify(self):
+        """Applies algebraic identities to the expressions in the node,
+        returns the node to use in its place.
+        """
+        if self.left:
+            self.left = self.left.simplify()
+        if self.right:
+            self.right = self.right.simplify()
+        return self
+
+    def can_speculate(self):
+        """Returns True if the expression is cheap and cannot trap, so it
+        may be computed even when its value is not used.
+        """
+        return False
+
+    def write_code_branch(self, output_lines: list, true_label, false_label):
+        """Emits a jump to true_label if the bool expression holds and to
+        false_label otherwise.
+        """
+        _, mem_id, val = self.write_code(output_lines)
+        condition = val if val != "" else f"%{mem_id}"
+        output_lines.append(
+            f"br i1 {condition}, label %l{true_label}, label %l{false_label}"
+        )
+
+    def write_code_negation(self, output_lines: list):
+        """Emits the negation of the bool expression, as write_code does."""
+        _, mem_id, val = self.write_code(output_lines)
+        if val != "":
+            return Types.Bool, -1, int(not val)
+        output_lines.append(
+            f"%{ProgramMemory.increment_and_read_mem()} = xor i1 %{mem_id}, 1"
+        )
+        return Types.Bool, ProgramMemory.mem_counter - 1, ""
+
 
 class Instruction(Node):
     def write_llvm_if(
@@ -61,6 +398,8 @@ class Instruction(Node):
 
     def write_llvm_label(self, output_lines: list, label):
         output_lines.append(f"l{label}:")
+        # phis name the block a value comes from
+        ProgramMemory.current_block = f"l{label}"
 
 
 class Instructions(Node):
@@ -81,6 +420,77 @@ class Instructions(Node):
             node_as_text += f" {indentation}{i}: {inst.__str__(indent_level)} \n"
         return node_as_text
 
+    def remove_dead_code(self):
+        instructions = []
+        for node in self.instructions:
+            instructions.extend(node.remove_dead_code())
+            if not node.falls_through():
+                # Everything after a loop that never ends is unreachable
+                break
+        self.instructions = instructions
+        return instructions
+
+    def falls_through(self):
+        return all(node.falls_through() for node in self.instructions)
+
+    def appended_variables(self, in_loop):
+        names = set()
+        for node in self.instructions:
+            names |= node.appended_variables(in_loop)
+        return names
+
+    def allocated_variables(self):
+        names = set()
+        for node in self.instructions:
+            names |= node.allocated_variables()
+        return names
+
+    def merge_writes(self):
+        instructions = []
+        for node in self.instructions:
+            node.merge_writes()
+            if (
+                instructions
+                and node.type == "write"
+                and instructions[-1].type == "write"
+            ):
+                instructions[-1].values.extend(node.values)
+            else:
+                instructions.append(node)
+        self.instructions = instructions
+
+    def simplify(self):
+        self.instructions = [node.simplify() for node in self.instructions]
+        return self
+
+    def assigned_variables(self):
+        names = set()
+        for node in self.instructions:
+            names |= node.assigned_variables()
+        return names
+
+    def used_variables(self):
+        names = set()
+        for node in self.instructions:
+            names |= node.used_variables()
+        return names
+
+    def live_variables(self, live):
+        for node in reversed(self.instructions):
+            live = node.live_variables(live)
+        return live
+
+    def remove_dead_stores(self, live):
+        instructions = []
+        for node in reversed(self.instructions):
+            if node.is_dead_store(live):
+                continue
+            live = node.remove_dead_stores(live)
+            instructions.append(node)
+        instructions.reverse()
+        self.instructions = instructions
+        return live
+
     def check_semantics(self, variables_dict):
         for node in self.instructions:
             semantic_check, _ = node.check_semantics(variables_dict)
@@ -91,8 +501,18 @@ class Instructions(Node):
     def write_code(self, output_lines: list):
         for node in self.instructions:
             node.write_code(output_lines)
+            ProgramMemory.release_temporaries(output_lines)
         return 0
 
+    def evaluate(self, context):
+        for node in self.instructions:
+            if not context.use_fuel():
+                return 1, None
+            status, _ = node.evaluate(context)
+            if status != 0:
+                return 1, None
+        return 0, None
+
 
 class AST:
     def __init__(self, root: Instructions) -> None:
@@ -120,33 +540,114 @@ class AST:
                     return 1
         return 0
 
+    def remove_dead_stores(self):
+        """Removes assignments whose value is never read and the
+        declarations of variables that are no longer used at all.
+        """
+        self.root.remove_dead_stores(set())
+        used = self.root.used_variables()
+        instructions = []
+        for node in self.root.instructions:
+            if node.type == "init node":
+                node.remove_unused_variables(used)
+                if not node.left:
+                    continue
+            instructions.append(node)
+        self.root.instructions = instructions
+
+    def evaluate_program(self):
+        """Runs the program at compile time, returns (status, output bytes).
+
+        Status is 1 when the program executes a read, runs out of fuel or
+        bytes, or hits an operation whose runtime result is undefined.
+        """
+        context = EvaluationContext(
+            ProgramMemory.evaluation_fuel, ProgramMemory.evaluation_bytes
+        )
+        if self.root:
+            status, _ = self.root.evaluate(context)
+            if status != 0:
+                return 1, b""
+        return 0, "".join(context.output).encode()
+
+    def create_constant_output(self, filename, output: bytes):
+        output_lines = []
+        l = len(output)
+        ProgramMemory.header_lines.append(
+            f"@output = private unnamed_addr constant [{l} x i8] {llvm_string_literal(output)}"
+        )
+        ProgramMemory.header_lines.append(f"")
+        ProgramMemory.header_lines.append(write_declaration)
+        ProgramMemory.header_lines.append(f"")
+        output_lines.append(f"define dso_local i32 @main() #0 {{")
+        if l > 0:
+            # write may take only part of the output, e.g. into a full pipe
+            write_all = ProgramMemory.use_runtime_function("@__majan_write_all")
+            output_lines.append(
+                f"call void {write_all}(i8* getelementptr inbounds ([{l} x i8], [{l} x i8]* @output, i64 0, i64 0), i64 {l})"
+            )
+        output_lines.append(f"ret i32 0")
+        output_lines.append(f"}}")
+        join_and_write_to_file_ll(filename, output_lines)
+
     def create_llvm_output(self, filename):
+        if self.root and ProgramMemory.dead_code_elimination:
+            self.root.remove_dead_code()
+        if ProgramMemory.partial_evaluation:
+            evaluation_status, output = self.evaluate_program()
+            if evaluation_status == 0:
+                self.create_constant_output(filename, output)
+                return
         output_lines = []
+        # Strings carry their length next to the pointer to the characters
+        ProgramMemory.header_lines.append(f"%string = type {{ i8*, i64 }}")
         # TODO Check if everything below is needed
-        ProgramMemory.header_lines.append(f'@int = constant [ 3 x i8] c"%d\\00"')
         ProgramMemory.header_lines.append(f'@double = constant [ 4 x i8] c"%lf\\00"')
         ProgramMemory.header_lines.append(f'@True = constant [5 x i8 ] c"True\\00"')
         ProgramMemory.header_lines.append(f'@False = constant [6 x i8 ] c"False\\00"')
-        ProgramMemory.header_lines.append(f'@strps = constant [4 x i8] c"%s\\0A\\00"')
-        ProgramMemory.header_lines.append(f'@strs = constant [5 x i8] c"%10s\\00"')
         ProgramMemory.header_lines.append(f"")
-        ProgramMemory.header_lines.append(f"declare i32 @printf(i8*, ...)")
-        ProgramMemory.header_lines.append(f"declare i32 @scanf(i8*, ...)")
+        ProgramMemory.header_lines.append(write_declaration)
+        ProgramMemory.header_lines.append(
+            f"declare i32 @snprintf(i8* noalias nocapture writeonly, i64, i8* nocapture readonly, ...) nounwind"
+        )
+        ProgramMemory.header_lines.append(
+            f"declare i64 @read(i32, i8* nocapture, i64) nounwind"
+        )
+        # The end pointer points into the text, so it is captured
+        ProgramMemory.header_lines.append(
+            f"declare double @strtod(i8* readonly, i8** nocapture) nounwind"
+        )
         ProgramMemory.header_lines.append(
             f"declare void @llvm.memcpy.p0i8.p0i8.i64(i8* noalias nocapture writeonly, i8* noalias nocapture readonly, i64, i1 immarg)"
         )
-        ProgramMemory.header_lines.append(f"declare i64 @strlen(i8*)")
-        ProgramMemory.header_lines.append(f"declare i8* @strcpy(i8*, i8*)")
-        ProgramMemory.header_lines.append(f"declare i8* @strcat(i8*, i8*)")
+        ProgramMemory.header_lines.append(f"declare noalias i8* @malloc(i64) nounwind")
+        ProgramMemory.header_lines.append(f"declare void @free(i8* nocapture) nounwind")
+        ProgramMemory.header_lines.append(f"declare i8* @llvm.stacksave()")
+        ProgramMemory.header_lines.append(f"declare void @llvm.stackrestore(i8*)")
         ProgramMemory.header_lines.append(f"")
         output_lines.append(
             f"define dso_local i32 @main() #0 {{"
         )  # TODO do we really need dso_local param?
+        # A named entry block does not take the first number, see phis in
+        # BinOp.write_code
+        output_lines.append(f"entry:")
+        ProgramMemory.current_block = "entry"
+        ProgramMemory.mem_counter = 0
         if self.root == None:
             output_lines.append(f"ret i32 0")
             output_lines.append(f"}}")
             join_and_write_to_file_ll(filename, output_lines)
             return
+        if ProgramMemory.algebraic_simplification:
+            self.root.simplify()
+        if ProgramMemory.dead_store_elimination:
+            self.remove_dead_stores()
+        if ProgramMemory.write_merging:
+            self.root.merge_writes()
+        # Strings built up in loops get a growable buffer, see Assign
+        ProgramMemory.string_builders = self.root.appended_variables(False)
+        # Strings that may own their buffer free it when overwritten
+        ProgramMemory.string_owners = self.root.allocated_variables()
         for node in self.root.instructions:
             if node.type == "init node":
                 var_type = node.variable_type
@@ -155,23 +656,76 @@ class AST:
                     ProgramMemory.variables_dict[next.name] = (
                         var_type,
                         0,
-                        ProgramMemory.mem_counter,
+                        f"{next.name}.addr",
                     )
                     next.write_init_code(output_lines)
                     next = next.left
             elif isinstance(node, Instruction):
                 node.write_code(output_lines)
+                ProgramMemory.release_temporaries(output_lines)
 
+        if "@__majan_flush" in ProgramMemory.used_runtime_functions:
+            output_lines.append(f"call void @__majan_flush()")
         output_lines.append(f"ret i32 0")
         output_lines.append(f"}}")
+        # Every fixed size alloca lives in the entry block, so loops run in
+        # constant stack space and LLVM can promote or color the slots
+        output_lines[2:2] = ProgramMemory.entry_lines
+        output_lines = optimize_function(output_lines)
         join_and_write_to_file_ll(filename, output_lines)
         return
 
 
+def optimize_function(function_lines):
+    if not (
+        ProgramMemory.register_promotion
+        or ProgramMemory.value_numbering
+        or ProgramMemory.loop_invariant_code_motion
+        or ProgramMemory.control_flow_simplification
+        or ProgramMemory.if_conversion
+        or ProgramMemory.strength_reduction
+    ):
+        return function_lines
+    statistics = ProgramMemory.optimization_statistics
+    function = Function(function_lines[1:-1])
+    if ProgramMemory.control_flow_simplification:
+        statistics["blocks removed by control flow simplification"] = (
+            simplify_control_flow(function)
+        )
+    if ProgramMemory.register_promotion:
+        statistics["promoted variables"] = promote_memory_to_registers(function)
+    if ProgramMemory.if_conversion:
+        statistics["branches converted to selects"] = convert_branches_to_selects(
+            function
+        )
+    if ProgramMemory.strength_reduction:
+        # Before value numbering, which shares the sign bits of a divided
+        # value, and after if conversion, which counts the instructions
+        statistics["instructions strength reduced"] = reduce_strength(function)
+    if ProgramMemory.value_numbering:
+        statistics["instructions removed by value numbering"] = (
+            number_values_locally(function)
+        )
+    if ProgramMemory.loop_invariant_code_motion:
+        statistics["instructions hoisted out of loops"] = hoist_loop_invariants(
+            function
+        )
+    if ProgramMemory.control_flow_simplification:
+        # Promotion and hoisting leave empty blocks and preheaders behind
+        statistics["blocks removed by control flow simplification"] += (
+            simplify_control_flow(function)
+        )
+    return [function_lines[0]] + function.to_lines() + [function_lines[-1]]
+
+
 def join_and_write_to_file_ll(filename, main_lines):
     ProgramMemory.header_lines.append(f"")
-    header = "\n".join(ProgramMemory.header_lines)
+    header = "\n".join(target_lines() + ProgramMemory.header_lines)
     main = "\n".join(main_lines)
     data = header + "\n" + main
+    # main only returns normally and is not called from the program
+    data += "\n\nattributes #0 = { norecurse nounwind }"
+    if ProgramMemory.metadata_lines:
+        data += "\n\n" + "\n".join(ProgramMemory.metadata_lines)
     with open(filename + ".ll", "w") as file:
         file.write(data)
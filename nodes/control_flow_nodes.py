@@ -1,4 +1,10 @@
-from .common import Instruction, Types, ProgramMemory
+from .common import (
+    Instruction,
+    Types,
+    ProgramMemory,
+    evaluate_constant,
+    variable_name,
+)
 
 
 class While(Instruction):
@@ -31,22 +37,133 @@ class While(Instruction):
         return 0, ""
 
     def write_code(self, output_lines: list):
-        cond_label = ProgramMemory.increment_and_read_label()
+        # The condition joins the values from before the loop and from the
+        # previous iteration, strings assigned in the body are not known
+        for name in self.left.assigned_variables():
+            ProgramMemory.known_strings.pop(name, None)
+        if ProgramMemory.no_signed_wrap:
+            self.__mark_counter_step()
         loop_label = ProgramMemory.increment_and_read_label()
         end_label = ProgramMemory.increment_and_read_label()
-        self.write_llvm_goto_label(output_lines, cond_label)
-        self.write_llvm_label(output_lines, cond_label)
-        _, cond_mem_id, cond_val = self.condition.write_code(output_lines)
-        if cond_val != "":
-            self.write_llvm_if(output_lines, cond_val, loop_label, end_label)
-        else:
-            self.write_llvm_if(output_lines, f"%{cond_mem_id}", loop_label, end_label)
+        # The loop is rotated, the condition is tested once before it and
+        # then at the bottom, so an iteration takes one conditional branch
+        self.__write_code_test(output_lines, loop_label, end_label)
         self.write_llvm_label(output_lines, loop_label)
         self.left.write_code(output_lines)
-        self.write_llvm_goto_label(output_lines, cond_label)
+        latch_start = len(output_lines)
+        self.__write_code_test(output_lines, loop_label, end_label)
+        loop_id = ProgramMemory.add_loop_metadata()
+        for i in range(latch_start, len(output_lines)):
+            if output_lines[i].startswith("br ") and f"label %l{loop_label}" in output_lines[i]:
+                output_lines[i] += f", !llvm.loop {loop_id}"
         self.write_llvm_label(output_lines, end_label)
+        for name in self.left.assigned_variables():
+            ProgramMemory.known_strings.pop(name, None)
         return 0
 
+    def __mark_counter_step(self):
+        """Marks 'i = i + 1' at the end of the body of 'while (i < n)', or
+        'i = i - 1' for 'while (i > n)', as not overflowing. The test held
+        at the start of the iteration and nothing else in the body assigns
+        i, so i is not the largest or smallest int.
+        """
+        condition = self.condition
+        if condition.type != "binop" or condition.op not in ["<", ">"]:
+            return
+        if not self.left.instructions:
+            return
+        step = self.left.instructions[-1]
+        if step.type != "assign node" or step.right.type != "binop":
+            return
+        name = step.left.name
+        if variable_name(condition.left) == name:
+            op = "+" if condition.op == "<" else "-"
+        elif variable_name(condition.right) == name:
+            op = "-" if condition.op == "<" else "+"
+        else:
+            return
+        increment = step.right
+        if not (
+            increment.op == op
+            and increment.result_type is Types.Int
+            and variable_name(increment.left) == name
+            and increment.right.type == "value"
+            and increment.right.value == 1
+        ):
+            return
+        for node in self.left.instructions[:-1]:
+            if name in node.assigned_variables():
+                return
+        increment.no_signed_wrap = True
+
+    def __write_code_test(self, output_lines, loop_label, end_label):
+        status, condition = evaluate_constant(self.condition)
+        if status == 0 and condition:
+            self.write_llvm_goto_label(output_lines, loop_label)
+        else:
+            self.condition.write_code_branch(output_lines, loop_label, end_label)
+
+    def remove_dead_code(self):
+        status, condition = evaluate_constant(self.condition)
+        if status == 0 and not condition:
+            return []
+        self.left.remove_dead_code()
+        return [self]
+
+    def falls_through(self):
+        status, condition = evaluate_constant(self.condition)
+        return not (status == 0 and condition)
+
+    def merge_writes(self):
+        self.left.merge_writes()
+
+    def simplify(self):
+        self.condition = self.condition.simplify()
+        return super().simplify()
+
+    def used_variables(self):
+        return self.condition.used_variables() | self.left.used_variables()
+
+    def __live_at_test(self, live):
+        # The condition is tested before the first iteration and after
+        # each one, so it sees what the body and the code after need
+        test_live = live | self.condition.used_variables()
+        while True:
+            body_live = self.left.live_variables(test_live)
+            next_live = test_live | body_live
+            if next_live == test_live:
+                return test_live
+            test_live = next_live
+
+    def live_variables(self, live):
+        return self.__live_at_test(live)
+
+    def remove_dead_stores(self, live):
+        test_live = self.__live_at_test(live)
+        self.left.remove_dead_stores(test_live)
+        return test_live
+
+    def appended_variables(self, in_loop):
+        return self.left.appended_variables(True)
+
+    def allocated_variables(self):
+        return self.left.allocated_variables()
+
+    def assigned_variables(self):
+        return self.left.assigned_variables()
+
+    def evaluate(self, context):
+        while context.use_fuel():
+            status, condition = self.condition.evaluate(context)
+            if status != 0:
+                return 1, None
+            if not condition:
+                return 0, None
+            status, _ = self.left.evaluate(context)
+            if status != 0:
+                return 1, None
+        return 1, None
+
 
 class If(Instruction):
     def __init__(self, line_no, condition, left, right=None) -> None:
@@ -85,32 +202,176 @@ class If(Instruction):
         return 0, ""
 
     def write_code(self, output_lines: list):
-        _, cond_mem_id, cond_val = self.condition.write_code(output_lines)
+        if ProgramMemory.switch_lowering:
+            variable, cases, default = self.__switch_cases()
+            if len(cases) >= 3:
+                return self.__write_code_switch(output_lines, variable, cases, default)
+        # Both branches start with the strings known before the if, after
+        # it only the ones no branch assigns are known
+        known_strings = dict(ProgramMemory.known_strings)
         then_label = ProgramMemory.increment_and_read_label()
         if self.right:
             else_label = ProgramMemory.increment_and_read_label()
             end_label = ProgramMemory.increment_and_read_label()
-            if cond_val != "":
-                self.write_llvm_if(output_lines, cond_val, then_label, else_label)
-            else:
-                self.write_llvm_if(
-                    output_lines, f"%{cond_mem_id}", then_label, else_label
-                )
+            self.condition.write_code_branch(output_lines, then_label, else_label)
             self.write_llvm_label(output_lines, then_label)
             self.left.write_code(output_lines)
             self.write_llvm_goto_label(output_lines, end_label)
             self.write_llvm_label(output_lines, else_label)
+            ProgramMemory.known_strings = dict(known_strings)
             self.right.write_code(output_lines)
         else:
             end_label = ProgramMemory.increment_and_read_label()
-            if cond_val != "":
-                self.write_llvm_if(output_lines, cond_val, then_label, end_label)
-            else:
-                self.write_llvm_if(
-                    output_lines, f"%{cond_mem_id}", then_label, end_label
-                )
+            self.condition.write_code_branch(output_lines, then_label, end_label)
             self.write_llvm_label(output_lines, then_label)
             self.left.write_code(output_lines)
         self.write_llvm_goto_label(output_lines, end_label)
         self.write_llvm_label(output_lines, end_label)
+        for name in self.assigned_variables():
+            known_strings.pop(name, None)
+        ProgramMemory.known_strings = known_strings
         return 0
+
+    def __switch_cases(self):
+        """Returns (variable, [(constant, body)], else body) for a ladder of
+        ifs nested in else branches that compare one int variable with
+        constants. A constant tested twice keeps the first body.
+        """
+        variable = None
+        cases = []
+        default = None
+        node = self
+        while node:
+            test = node.__equality_test()
+            if not test or (variable and test[0].name != variable.name):
+                break
+            variable, constant = test
+            if constant not in [case for case, _ in cases]:
+                cases.append((constant, node.left))
+            default = node.right
+            node = None
+            if default and len(default.instructions) == 1:
+                if isinstance(default.instructions[0], If):
+                    node = default.instructions[0]
+        return variable, cases, default
+
+    def __equality_test(self):
+        # (variable, constant) for 'x == constant' or 'constant == x'
+        if getattr(self.condition, "op", None) != "==":
+            return None
+        for variable, other in [
+            (self.condition.left, self.condition.right),
+            (self.condition.right, self.condition.left),
+        ]:
+            if variable.type != "variable":
+                continue
+            if ProgramMemory.variables_dict[variable.name][0] is not Types.Int:
+                return None
+            status, constant = evaluate_constant(other)
+            if status == 0:
+                return variable, constant
+        return None
+
+    def __write_code_switch(self, output_lines, variable, cases, default):
+        # One switch replaces the chain of compares, LLVM picks a jump
+        # table or a binary search for it
+        known_strings = dict(ProgramMemory.known_strings)
+        _, value_mem_id, _ = variable.write_code(output_lines)
+        case_labels = [ProgramMemory.increment_and_read_label() for _ in cases]
+        end_label = ProgramMemory.increment_and_read_label()
+        default_label = end_label
+        if default:
+            default_label = ProgramMemory.increment_and_read_label()
+        targets = " ".join(
+            f"i32 {constant}, label %l{label}"
+            for (constant, _), label in zip(cases, case_labels)
+        )
+        output_lines.append(
+            f"switch i32 %{value_mem_id}, label %l{default_label} [ {targets} ]"
+        )
+        bodies = [(label, body) for label, (_, body) in zip(case_labels, cases)]
+        if default:
+            bodies.append((default_label, default))
+        for label, body in bodies:
+            self.write_llvm_label(output_lines, label)
+            ProgramMemory.known_strings = dict(known_strings)
+            body.write_code(output_lines)
+            self.write_llvm_goto_label(output_lines, end_label)
+        self.write_llvm_label(output_lines, end_label)
+        for name in self.assigned_variables():
+            known_strings.pop(name, None)
+        ProgramMemory.known_strings = known_strings
+        return 0
+
+    def evaluate(self, context):
+        status, condition = self.condition.evaluate(context)
+        if status != 0:
+            return 1, None
+        if condition:
+            return self.left.evaluate(context)
+        if self.right:
+            return self.right.evaluate(context)
+        return 0, None
+
+    def remove_dead_code(self):
+        status, condition = evaluate_constant(self.condition)
+        if status == 0:
+            if condition:
+                return self.left.remove_dead_code()
+            if self.right:
+                return self.right.remove_dead_code()
+            return []
+        self.left.remove_dead_code()
+        if self.right:
+            self.right.remove_dead_code()
+            if not self.right.instructions:
+                self.right = None
+        if not self.left.instructions and not self.right:
+            # Conditions have no side effects, so an empty if does nothing
+            return []
+        return [self]
+
+    def falls_through(self):
+        if not self.right:
+            return True
+        return self.left.falls_through() or self.right.falls_through()
+
+    def merge_writes(self):
+        self.left.merge_writes()
+        if self.right:
+            self.right.merge_writes()
+
+    def simplify(self):
+        self.condition = self.condition.simplify()
+        return super().simplify()
+
+    def used_variables(self):
+        return self.condition.used_variables() | super().used_variables()
+
+    def live_variables(self, live):
+        names = self.left.live_variables(live)
+        names = names | (self.right.live_variables(live) if self.right else live)
+        return names | self.condition.used_variables()
+
+    def remove_dead_stores(self, live):
+        names = self.left.remove_dead_stores(live)
+        names = names | (self.right.remove_dead_stores(live) if self.right else live)
+        return names | self.condition.used_variables()
+
+    def appended_variables(self, in_loop):
+        names = self.left.appended_variables(in_loop)
+        if self.right:
+            names |= self.right.appended_variables(in_loop)
+        return names
+
+    def allocated_variables(self):
+        names = self.left.allocated_variables()
+        if self.right:
+            names |= self.right.allocated_variables()
+        return names
+
+    def assigned_variables(self):
+        names = self.left.assigned_variables()
+        if self.right:
+            names |= self.right.assigned_variables()
+        return names
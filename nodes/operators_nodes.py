@@ -1,4 +1,14 @@
-from .common import Instruction, Types, ProgramMemory
+import math
+
+from .common import (
+    Instruction,
+    Types,
+    ProgramMemory,
+    evaluate_constant,
+    variable_name,
+    wrap_int,
+)
+from .values_nodes import Value, IntValue, FloatValue, BoolValue
 
 
 class BinOp(Instruction):
@@ -15,12 +25,34 @@ class BinOp(Instruction):
         (">=", "f"): "uge",
     }
 
+    # Negation of each predicate, NaN operands flip between ordered and
+    # unordered ones
+    inverse_llvm_operators = {
+        "eq": "ne",
+        "oeq": "une",
+        "slt": "sge",
+        "ult": "oge",
+        "sgt": "sle",
+        "ugt": "ole",
+        "sle": "sgt",
+        "ule": "ogt",
+        "sge": "slt",
+        "uge": "olt",
+    }
+
     math_llvm_operators = {"+": "add", "-": "sub", "*": "mul", "/": "div"}
 
     def __init__(self, line_no, left, op, right):
         super().__init__(line_no, left, right)
         self.type = "binop"
         self.op = op
+        self.result_escapes = False
+        # Size of the heap buffer made for an escaping concatenation
+        self.allocated_size = None
+        self.result_type = None
+        self.operand_types = (None, None)
+        # Set for loop counters that cannot overflow, see While
+        self.no_signed_wrap = False
 
     def check_semantics(self, variables_dict):
         left_semantic_check, left_type = self.left.check_semantics(variables_dict)
@@ -31,11 +63,18 @@ class BinOp(Instruction):
             return (1, "")
         match self.op:
             case "+" | "-" | "*" | "/":
-                return self.__handle_arithmetic_operator(self.op, left_type, right_type)
+                result = self.__handle_arithmetic_operator(
+                    self.op, left_type, right_type
+                )
             case "or" | "and" | "xor":
-                return self.__handle_logical_operator(self.op, left_type, right_type)
+                result = self.__handle_logical_operator(self.op, left_type, right_type)
             case "==" | ">" | "<" | "<=" | ">=":
-                return self.__handle_comparison_operator(self.op, left_type, right_type)
+                result = self.__handle_comparison_operator(
+                    self.op, left_type, right_type
+                )
+        self.result_type = result[1]
+        self.operand_types = (left_type, right_type)
+        return result
 
     def __handle_comparison_operator(self, operation_name, left_type, right_type):
         if left_type in [Types.String]:
@@ -92,57 +131,20 @@ class BinOp(Instruction):
         left_type, left_mem_id, left_val = self.left.write_code(output_lines)
         right_type, right_mem_id, right_val = self.right.write_code(output_lines)
         if left_type == right_type == Types.String and self.op == "+":
-            l = left_val + right_val + 1
-            output_lines.append(f"%{ProgramMemory.mem_counter} = alloca [{l} x i8]")
-            mem_str = ProgramMemory.mem_counter
-            ProgramMemory.mem_counter += 1
-            output_lines.append(f"%{ProgramMemory.mem_counter} = alloca i8*")
-            mem_ptrstr = ProgramMemory.mem_counter
-            ProgramMemory.mem_counter += 1
-            output_lines.append(
-                f"%{ProgramMemory.mem_counter} = getelementptr inbounds [{l} x i8], [{l} x i8]* %{mem_str}, i64 0, i64 0"
-            )
-            output_lines.append(
-                f"store i8* %{ProgramMemory.mem_counter - 1}, i8** %{mem_ptrstr}"
-            )
-            output_lines.append(
-                f"%{ProgramMemory.increment_and_read_mem()} = load i8*, i8** %{mem_ptrstr}"
-            )
-            ProgramMemory.mem_counter += 1
-            output_lines.append(  # Not sure if % should be before left_mem_id
-                f"%{ProgramMemory.mem_counter} = call i8* @strcpy(i8* %{ProgramMemory.mem_counter - 1}, i8* %{left_mem_id})"
-            )
-            ProgramMemory.mem_counter += 1
-            output_lines.append(  # Not sure if % should be before right_mem_id
-                f"%{ProgramMemory.mem_counter} = call i8* @strcat(i8* %{ProgramMemory.mem_counter - 2}, i8* %{right_mem_id})"
+            return self.__write_code_concatenation(
+                output_lines, left_mem_id, right_mem_id
             )
-            ProgramMemory.mem_counter += 1
-            return Types.String, ProgramMemory.mem_counter - 3, l - 1
 
         if left_type != right_type:
             return_type = Types.Float
             if left_type is Types.Int:
-                if left_val != "":
-                    output_lines.append(
-                        f"%{ProgramMemory.mem_counter} = sitofp i32 {left_val} to double"
-                    )
-                else:
-                    output_lines.append(
-                        f"%{ProgramMemory.mem_counter} = sitofp i32 %{left_mem_id} to double"
-                    )
-                left_val = ""
-                left_mem_id = ProgramMemory.increment_and_read_mem()
+                left_mem_id, left_val = ProgramMemory.convert_to_double(
+                    output_lines, left_mem_id, left_val, variable_name(self.left)
+                )
             else:
-                if right_val != "":
-                    output_lines.append(
-                        f"%{ProgramMemory.mem_counter} = sitofp i32 {right_val} to double"
-                    )
-                else:
-                    output_lines.append(
-                        f"%{ProgramMemory.mem_counter} = sitofp i32 %{right_mem_id} to double"
-                    )
-                right_val = ""
-                right_mem_id = ProgramMemory.increment_and_read_mem()
+                right_mem_id, right_val = ProgramMemory.convert_to_double(
+                    output_lines, right_mem_id, right_val, variable_name(self.right)
+                )
         else:
             return_type = left_type
 
@@ -153,9 +155,14 @@ class BinOp(Instruction):
             result_type = "double"
             prefix = "f"
         if result_type == "i32" and self.op == "/":
-            prefix = "u"
+            prefix = "s"
 
         operation = self.math_llvm_operators[self.op]
+        # MAJAN ints wrap around, nsw is only known for loop counters
+        if result_type == "i32" and self.no_signed_wrap and self.op != "/":
+            operation += " nsw"
+        if result_type == "double" and ProgramMemory.fast_math:
+            operation += " fast"
 
         if left_val != "" and right_val != "":
             output_lines.append(
@@ -171,69 +178,70 @@ class BinOp(Instruction):
             )
         else:
             output_lines.append(
-                f"%{ProgramMemory.increment_and_read_mem()} = {prefix}{operation} {result_type} %{left_mem_id}, %{right_mem_id}"
+                f"%{ProgramMemory.mem_counter} = {prefix}{operation} {result_type} %{left_mem_id}, %{right_mem_id}"
             )
         return return_type, ProgramMemory.increment_and_read_mem(), ""
 
+    def __write_code_concatenation(
+        self, output_lines: list, left_mem_id, right_mem_id
+    ):
+        # The buffer is allocated here, a stack buffer would not outlive a
+        # helper that allocates it, the copying is done by @__majan_concat
+        concat = ProgramMemory.use_runtime_function("@__majan_concat")
+        lengths = []
+        for mem_id in [left_mem_id, right_mem_id]:
+            length = ProgramMemory.increment_and_read_mem()
+            output_lines.append(f"%{length} = extractvalue %string %{mem_id}, 1")
+            lengths.append(length)
+        length = ProgramMemory.increment_and_read_mem()
+        output_lines.append(f"%{length} = add i64 %{lengths[0]}, %{lengths[1]}")
+        size = ProgramMemory.increment_and_read_mem()
+        output_lines.append(f"%{size} = add i64 %{length}, 1")
+        mem_str = ProgramMemory.allocate_string_buffer(
+            output_lines, f"%{size}", self.result_escapes
+        )
+        if self.result_escapes:
+            self.allocated_size = f"%{size}"
+        output_lines.append(
+            f"%{ProgramMemory.increment_and_read_mem()} = call %string {concat}(i8* %{mem_str}, %string %{left_mem_id}, %string %{right_mem_id})"
+        )
+        return Types.String, ProgramMemory.mem_counter - 1, ""
+
     def __write_code_logical_operators(self, output_lines: list):
         if self.op in ["and", "or"]:
-            first_case_label = ProgramMemory.increment_and_read_label()
-            second_case_label = ProgramMemory.increment_and_read_label()
-            end_label = ProgramMemory.increment_and_read_label()
-            label_go_to_end = ProgramMemory.increment_and_read_label()
-            self.write_llvm_goto_label(output_lines, first_case_label)
-            self.write_llvm_label(output_lines, first_case_label)
-            if self.op == "and":
-                if left_val != "":
-                    self.write_llvm_if(
-                        output_lines, left_val, second_case_label, end_label
-                    )
-                else:
-                    self.write_llvm_if(
-                        output_lines,
-                        f"%{left_mem_id}",
-                        second_case_label,
-                        end_label,
-                    )
-                self.write_llvm_label(output_lines, second_case_label)
+            # and gives false and or gives true without looking at the right
+            # operand, which is only computed when the left one does not
+            # decide the result
+            short_circuit = "false" if self.op == "and" else "true"
+            _, left_mem_id, left_val = self.left.write_code(output_lines)
+            left = left_val if left_val != "" else f"%{left_mem_id}"
+            if self.right.can_speculate():
                 _, right_mem_id, right_val = self.right.write_code(output_lines)
-                self.write_llvm_goto_label(output_lines, label_go_to_end)
-                self.write_llvm_label(output_lines, label_go_to_end)
-                self.write_llvm_goto_label(output_lines, end_label)
-                self.write_llvm_label(output_lines, end_label)
-                if right_val != "":
-                    output_lines.append(
-                        f"%{ProgramMemory.mem_counter} = phi i1[0, %l{first_case_label}],[{right_val},%l{label_go_to_end}]"
-                    )
+                right = right_val if right_val != "" else f"%{right_mem_id}"
+                if self.op == "and":
+                    choices = f"i1 {right}, i1 false"
+                else:
+                    choices = f"i1 true, i1 {right}"
                 output_lines.append(
-                    f"%{ProgramMemory.mem_counter} = phi i1[0, %l{first_case_label}],[%{right_mem_id},%l{label_go_to_end}]"
+                    f"%{ProgramMemory.increment_and_read_mem()} = select i1 {left}, {choices}"
                 )
-            if self.op == "or":
-                if left_val != "":
-                    self.write_llvm_if(
-                        output_lines, left_val, end_label, second_case_label
-                    )
-                else:
-                    self.write_llvm_if(
-                        output_lines,
-                        f"%{left_mem_id}",
-                        end_label,
-                        second_case_label,
-                    )
-                self.write_llvm_label(output_lines, second_case_label)
-                _, right_mem_id, right_val = self.right.write_code(output_lines)
-                self.write_llvm_goto_label(output_lines, label_go_to_end)
-                self.write_llvm_label(output_lines, label_go_to_end)
-                self.write_llvm_goto_label(output_lines, end_label)
-                self.write_llvm_label(output_lines, end_label)
-                if right_val != "":
-                    output_lines.append(
-                        f"%{ProgramMemory.increment_and_read_mem()} = phi i1[1, %l{first_case_label}],[{right_val},%l{label_go_to_end}]"
-                    )
-                else:
-                    output_lines.append(
-                        f"%{ProgramMemory.increment_and_read_mem()} = phi i1[1, %l{first_case_label}],[%{right_mem_id},%l{label_go_to_end}]"
-                    )
+                return Types.Bool, ProgramMemory.mem_counter - 1, ""
+            left_block = ProgramMemory.current_block
+            right_label = ProgramMemory.increment_and_read_label()
+            end_label = ProgramMemory.increment_and_read_label()
+            if self.op == "and":
+                self.write_llvm_if(output_lines, left, right_label, end_label)
+            else:
+                self.write_llvm_if(output_lines, left, end_label, right_label)
+            self.write_llvm_label(output_lines, right_label)
+            _, right_mem_id, right_val = self.right.write_code(output_lines)
+            right = right_val if right_val != "" else f"%{right_mem_id}"
+            right_block = ProgramMemory.current_block
+            self.write_llvm_goto_label(output_lines, end_label)
+            self.write_llvm_label(output_lines, end_label)
+            output_lines.append(
+                f"%{ProgramMemory.increment_and_read_mem()} = phi i1 [{short_circuit}, %{left_block}], [{right}, %{right_block}]"
+            )
             return Types.Bool, ProgramMemory.mem_counter - 1, ""
         if self.op == "xor":
             _, left_mem_id, left_val = self.left.write_code(output_lines)
@@ -266,7 +274,7 @@ class BinOp(Instruction):
                 )
             return Types.Bool, ProgramMemory.mem_counter - 1, ""
 
-    def __write_code_comparison_operators(self, output_lines: list):
+    def __write_code_comparison_operators(self, output_lines: list, negate=False):
         left_type, left_mem_id, left_val = self.left.write_code(output_lines)
         _, right_mem_id, right_val = self.right.write_code(output_lines)
         if left_type == Types.Bool:
@@ -279,6 +287,8 @@ class BinOp(Instruction):
             args_type = "i32"
             prefix = "i"
         operation = self.comparison_llvm_operators[(self.op, prefix)]
+        if negate:
+            operation = self.inverse_llvm_operators[operation]
         cmp_operation = (
             f"%{ProgramMemory.increment_and_read_mem()} = {prefix}cmp {operation} {args_type} "
             + "{left_val} , {right_val}"
@@ -296,12 +306,234 @@ class BinOp(Instruction):
                 cmp_operation.format(left_val=left_val, right_val=f"%{right_mem_id}")
             )
         else:
-            cmp_operation.format(
-                left_val=f"%{left_mem_id}", right_val=f"%{right_mem_id}"
+            output_lines.append(
+                cmp_operation.format(
+                    left_val=f"%{left_mem_id}", right_val=f"%{right_mem_id}"
+                )
             )
         return Types.Bool, ProgramMemory.mem_counter - 1, ""
 
+    def __evaluate_arithmetic_operation(self, left, right):
+        if isinstance(left, str):
+            return 0, left + right
+        if isinstance(left, float) or isinstance(right, float):
+            if self.op == "/" and right == 0:
+                return 1, None
+            match self.op:
+                case "+":
+                    return 0, float(left) + right
+                case "-":
+                    return 0, float(left) - right
+                case "*":
+                    return 0, float(left) * right
+                case "/":
+                    return 0, float(left) / right
+        match self.op:
+            case "+":
+                return 0, wrap_int(left + right)
+            case "-":
+                return 0, wrap_int(left - right)
+            case "*":
+                return 0, wrap_int(left * right)
+            case "/":
+                # sdiv traps on division by zero and on -2**31 / -1
+                if right == 0 or (left == -(2**31) and right == -1):
+                    return 1, None
+                quotient = abs(left) // abs(right)
+                return 0, quotient if (left < 0) == (right < 0) else -quotient
+
+    def __evaluate_comparison_operation(self, left, right):
+        if isinstance(left, bool):
+            # icmp on i1 is signed, so true is -1 for the ordering operators
+            left, right = -left, -right
+        if isinstance(left, float):
+            # fcmp uses unordered predicates except for ==
+            match self.op:
+                case "==":
+                    return 0, left == right
+                case "<":
+                    return 0, not left >= right
+                case ">":
+                    return 0, not left <= right
+                case "<=":
+                    return 0, not left > right
+                case ">=":
+                    return 0, not left < right
+        match self.op:
+            case "==":
+                return 0, left == right
+            case "<":
+                return 0, left < right
+            case ">":
+                return 0, left > right
+            case "<=":
+                return 0, left <= right
+            case ">=":
+                return 0, left >= right
+
+    def evaluate(self, context):
+        left_status, left = self.left.evaluate(context)
+        if left_status != 0:
+            return 1, None
+        if self.op == "and" and not left:
+            return 0, False
+        if self.op == "or" and left:
+            return 0, True
+        right_status, right = self.right.evaluate(context)
+        if right_status != 0:
+            return 1, None
+        if self.op in ["and", "or"]:
+            return 0, right
+        if self.op == "xor":
+            return 0, left != right
+        if self.op in ["+", "-", "*", "/"]:
+            if isinstance(left, str) and not context.use_bytes(
+                len(left) + len(right)
+            ):
+                return 1, None
+            return self.__evaluate_arithmetic_operation(left, right)
+        return self.__evaluate_comparison_operation(left, right)
+
+    def remove_dead_code(self):
+        # Expression statement, its value is discarded
+        return []
+
+    def simplify(self):
+        super().simplify()
+        if self.result_type in [None, Types.String]:
+            return self
+        status, value = evaluate_constant(self)
+        if status == 0 and not (isinstance(value, float) and math.isnan(value)):
+            # The sign of a nan computed at runtime depends on the operation
+            return constant_node(self.line_no, self.result_type, value)
+        if self.op in ["and", "or", "xor"]:
+            return self.__simplify_logical_operation()
+        if self.op in ["+", "-", "*", "/"]:
+            return self.__simplify_arithmetic_operation()
+        return self
+
+    def __simplify_logical_operation(self):
+        left, right = self.left, self.right
+        if self.op == "and":
+            if is_constant(right, True):
+                return left
+            if is_constant(left, True) or is_constant(left, False):
+                return right if is_constant(left, True) else left
+            if is_constant(right, False) and left.can_speculate():
+                return right
+        elif self.op == "or":
+            if is_constant(right, False):
+                return left
+            if is_constant(left, False) or is_constant(left, True):
+                return right if is_constant(left, False) else left
+            if is_constant(right, True) and left.can_speculate():
+                return right
+        else:
+            for value, other in [(left, right), (right, left)]:
+                if is_constant(value, False):
+                    return other
+                if is_constant(value, True):
+                    return UnOp(self.line_no, other, "!").simplify()
+        return self
+
+    def __simplify_arithmetic_operation(self):
+        left_type, right_type = self.operand_types
+        is_int = self.result_type is Types.Int
+        # Float identities that do not hold for every value, e.g. -0.0 + 0.0
+        # is 0.0, and reassociation, which changes rounding
+        is_exact = is_int or ProgramMemory.fast_math
+        if self.op in ["+", "*"] and isinstance(self.left, Value):
+            # Constants go to the right, so they can be combined below
+            self.left, self.right = self.right, self.left
+            left_type, right_type = right_type, left_type
+            self.operand_types = (left_type, right_type)
+        left, right = self.left, self.right
+        keeps_type = left_type is self.result_type
+        if keeps_type and (
+            (self.op in ["*", "/"] and is_constant(right, 1))
+            or (self.op == "-" and is_constant(right, 0))
+            or (self.op == "+" and is_constant(right, 0) and is_exact)
+        ):
+            return left
+        if (
+            self.op == "*"
+            and is_constant(right, 0)
+            and is_exact
+            and left.can_speculate()
+        ):
+            return constant_node(self.line_no, self.result_type, 0)
+        # (x + 1) + 2 is x + 3 and (x * 2) * 3 is x * 6
+        if not (
+            is_exact
+            and isinstance(right, Value)
+            and isinstance(left, BinOp)
+            and left.result_type is self.result_type
+            and isinstance(left.right, Value)
+        ):
+            return self
+        inner, outer = left.right.value, right.value
+        if self.op in ["+", "-"] and left.op in ["+", "-"]:
+            inner = inner if left.op == "+" else -inner
+            outer = outer if self.op == "+" else -outer
+            op, value = "+", inner + outer
+        elif self.op == "*" and left.op == "*":
+            op, value = "*", inner * outer
+        else:
+            return self
+        if is_int:
+            value = wrap_int(value)
+        node = BinOp(
+            self.line_no,
+            left.left,
+            op,
+            constant_node(self.line_no, self.result_type, value),
+        )
+        node.result_type = self.result_type
+        node.operand_types = (left.operand_types[0], self.result_type)
+        return node.simplify()
+
+    def static_string(self):
+        if self.op != "+" or not ProgramMemory.string_folding:
+            return None
+        left = self.left.static_string()
+        right = self.right.static_string()
+        if left is None or right is None:
+            return None
+        return left + right
+
+    def can_speculate(self):
+        if not (self.left.can_speculate() and self.right.can_speculate()):
+            return False
+        if self.result_type is Types.String:
+            # Concatenation allocates a buffer
+            return self.static_string() is not None
+        if self.op == "/" and self.result_type is Types.Int:
+            # sdiv traps on division by zero and on -2**31 / -1
+            status, divisor = evaluate_constant(self.right)
+            return status == 0 and divisor not in [0, -1]
+        return True
+
+    def write_code_branch(self, output_lines: list, true_label, false_label):
+        if self.op not in ["and", "or"]:
+            return super().write_code_branch(output_lines, true_label, false_label)
+        # The right operand gets its own block, which the left operand
+        # enters only when it does not decide the result
+        right_label = ProgramMemory.increment_and_read_label()
+        if self.op == "and":
+            self.left.write_code_branch(output_lines, right_label, false_label)
+        else:
+            self.left.write_code_branch(output_lines, true_label, right_label)
+        self.write_llvm_label(output_lines, right_label)
+        self.right.write_code_branch(output_lines, true_label, false_label)
+
+    def write_code_negation(self, output_lines: list):
+        if self.op not in ["==", ">", ">=", "<", "<="]:
+            return super().write_code_negation(output_lines)
+        return self.__write_code_comparison_operators(output_lines, negate=True)
+
     def write_code(self, output_lines: list):
+        if self.static_string() is not None:
+            return Types.String, ProgramMemory.intern_string(self.static_string()), ""
         if self.op in ["+", "-", "*", "/"]:
             return self.__write_code_arithmetic_operation(output_lines)
         if self.op in ["and", "or", "xor"]:
@@ -332,17 +564,35 @@ class UnOp(Instruction):
             return (0, Types.Bool)
 
     def write_code(self, output_lines: list):
-        _, mem_id, val = self.left.write_code(output_lines)
-        if val != "":
-            output_lines.append(
-                f"%{ProgramMemory.increment_and_read_mem()} = xor i1 {val}, 1"
-            )
-        else:
-            output_lines.append(
-                f"%{ProgramMemory.increment_and_read_mem()} = xor i1 %{mem_id}, 1"
-            )
+        # Comparisons are emitted with the inverse predicate
+        return self.left.write_code_negation(output_lines)
 
-        return Types.Bool, ProgramMemory.mem_counter - 1, ""
+    def write_code_negation(self, output_lines: list):
+        return self.left.write_code(output_lines)
+
+    def write_code_branch(self, output_lines: list, true_label, false_label):
+        self.left.write_code_branch(output_lines, false_label, true_label)
+
+    def can_speculate(self):
+        return self.left.can_speculate()
+
+    def remove_dead_code(self):
+        return []
+
+    def simplify(self):
+        super().simplify()
+        if isinstance(self.left, UnOp):
+            return self.left.left
+        status, value = evaluate_constant(self)
+        if status == 0:
+            return constant_node(self.line_no, Types.Bool, value)
+        return self
+
+    def evaluate(self, context):
+        status, value = self.left.evaluate(context)
+        if status != 0:
+            return 1, None
+        return 0, not value
 
 
 class Length(Instruction):
@@ -366,12 +616,46 @@ class Length(Instruction):
         return super().__str__(indent_level, f"({self.type})")
 
     def write_code(self, output_lines):
+        if self.left.static_string() is not None:
+            return Types.Int, -1, len(self.left.static_string().encode())
         _, var_mem_id, _ = self.left.write_code(output_lines)
+        # The length is stored next to the characters, no need to count them
+        len_mem_id = ProgramMemory.increment_and_read_mem()
+        output_lines.append(f"%{len_mem_id} = extractvalue %string %{var_mem_id}, 1")
         output_lines.append(
-            f"%{ProgramMemory.increment_and_read_mem()} = call i64 @strlen(i8* %{var_mem_id})"
-        )
-        output_lines.append(
-            f"%{ProgramMemory.increment_and_read_mem()} = trunc i64 %{ProgramMemory.mem_counter - 1} to i32"
+            f"%{ProgramMemory.increment_and_read_mem()} = trunc i64 %{len_mem_id} to i32"
         )
 
         return Types.Int, ProgramMemory.mem_counter - 1, ""
+
+    def can_speculate(self):
+        return True
+
+    def evaluate(self, context):
+        status, value = self.left.evaluate(context)
+        if status != 0:
+            return 1, None
+        return 0, len(value.encode())
+
+    def remove_dead_code(self):
+        return []
+
+
+def constant_node(line_no, value_type, value):
+    match value_type:
+        case Types.Int:
+            return IntValue(line_no, value)
+        case Types.Float:
+            return FloatValue(line_no, float(value))
+        case Types.Bool:
+            return BoolValue(line_no, int(value))
+
+
+def is_constant(node, value):
+    # x - -0.0 is not x for x = -0.0, so the sign of zero counts
+    return (
+        isinstance(node, Value)
+        and node.value_type is not Types.String
+        and node.value == value
+        and math.copysign(1, node.value) == math.copysign(1, value)
+    )
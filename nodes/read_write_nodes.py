@@ -1,10 +1,14 @@
-from .common import Instruction, Types, ProgramMemory
+import math
+
+from .common import Instruction, Types, ProgramMemory, evaluate_constant
 
 
 class Write(Instruction):
     def __init__(self, line_no, value) -> None:
         super().__init__(line_no, value)
         self.type = "write"
+        # Adjacent writes are joined into one node, see merge_writes
+        self.values = [value]
 
     def check_semantics(self, variables_dict):
         left_semantic_check, id_type = self.left.check_semantics(variables_dict)
@@ -12,58 +16,115 @@ class Write(Instruction):
             return (1, "")
         return (0, id_type)
 
+    def simplify(self):
+        self.values = [value_node.simplify() for value_node in self.values]
+        self.left = self.values[0]
+        return self
+
+    def used_variables(self):
+        names = set()
+        for value_node in self.values:
+            names |= value_node.used_variables()
+        return names
+
     def write_code(self, output_lines: list):
-        type, mem_id, val = self.left.write_code(output_lines)
-        if type == Types.Int:
-            if val != "":
-                output_lines.append(
-                    f"call i32(i8*, ...) @printf(i8* bitcast([3 x i8]* @int to i8 *), i32 {val})"
-                )
-            else:
-                output_lines.append(
-                    f"call i32(i8*, ...) @printf(i8* bitcast([3 x i8]* @int to i8 *), i32 %{mem_id})"
+        # Output known at compile time is collected into one literal, which
+        # also takes the newline after a string, so a run of writes needs a
+        # call only for each value computed at runtime
+        text = ""
+        for value_node in self.values:
+            static_text = self.__static_text(value_node)
+            if static_text is not None:
+                text += static_text
+                continue
+            type, mem_id, val = value_node.write_code(output_lines)
+            if type == Types.Int and val != "" and ProgramMemory.write_merging:
+                # e.g. length() of a string known only during code generation
+                text += f"{int(val)}"
+                continue
+            value = val if val != "" else f"%{mem_id}"
+            if text:
+                self.__write_code_text(output_lines, text)
+                text = ""
+            if type == Types.Int:
+                write_int = ProgramMemory.use_runtime_function("@__majan_write_int")
+                output_lines.append(f"call void {write_int}(i32 {value})")
+            if type == Types.Float:
+                write_double = ProgramMemory.use_runtime_function(
+                    "@__majan_write_double"
                 )
-            ProgramMemory.mem_counter += 1
-        if type == Types.Float:
-            if val != "":
-                output_lines.append(
-                    f"call i32(i8*, ...) @printf(i8* bitcast([4 x i8]* @double to i8 *), double {val})"
-                )
-            else:
-                output_lines.append(
-                    f"call i32(i8*, ...) @printf(i8* bitcast([4 x i8]* @double to i8 *), double %{mem_id})"
-                )
-            ProgramMemory.mem_counter += 1
-        if type == Types.Bool:
-            then_label = ProgramMemory.increment_and_read_label()
-            else_label = ProgramMemory.increment_and_read_label()
-            end_label = ProgramMemory.increment_and_read_label()
-            if val != "":
-                self.write_llvm_if(output_lines, val, then_label, else_label)
-            else:
-                self.write_llvm_if(output_lines, f"%{mem_id}", then_label, else_label)
-            self.write_llvm_label(output_lines, then_label)
-            output_lines.append(
-                "call i32(i8*, ...) @printf(i8* bitcast([5 x i8]* @True   to i8 *), i32 5)"
-            )
-            ProgramMemory.mem_counter += 1
-            self.write_llvm_goto_label(output_lines, end_label)
-            self.write_llvm_label(output_lines, else_label)
-            output_lines.append(
-                "call i32(i8*, ...) @printf(i8* bitcast([6 x i8]* @False   to i8 *), i32 5)"
-            )
-            ProgramMemory.mem_counter += 1
-            self.write_llvm_goto_label(output_lines, end_label)
-            self.write_llvm_label(output_lines, end_label)
-        if type == Types.String:
-            # No need to load mem_id before, because we are printing from dispatched variable
-            ProgramMemory.mem_counter += 1
-            output_lines.append(
-                f"%{ProgramMemory.mem_counter} = call i32 (i8*, ...) @printf(i8* getelementptr inbounds ([4 x i8], [4 x i8]* @strps, i32 0, i32 0), i8* %{mem_id})"
-            )
-
+                output_lines.append(f"call void {write_double}(double {value})")
+            if type == Types.Bool:
+                write_bool = ProgramMemory.use_runtime_function("@__majan_write_bool")
+                output_lines.append(f"call void {write_bool}(i1 {value})")
+            if type == Types.String:
+                pointer = ProgramMemory.increment_and_read_mem()
+                output_lines.append(f"%{pointer} = extractvalue %string %{mem_id}, 0")
+                length = ProgramMemory.increment_and_read_mem()
+                output_lines.append(f"%{length} = extractvalue %string %{mem_id}, 1")
+                if ProgramMemory.write_merging:
+                    write_bytes = ProgramMemory.use_runtime_function(
+                        "@__majan_write_bytes"
+                    )
+                    output_lines.append(
+                        f"call void {write_bytes}(i8* %{pointer}, i64 %{length})"
+                    )
+                    text = "\n"
+                else:
+                    write_string = ProgramMemory.use_runtime_function(
+                        "@__majan_write_string"
+                    )
+                    output_lines.append(
+                        f"call void {write_string}(i8* %{pointer}, i64 %{length})"
+                    )
+        if text:
+            self.__write_code_text(output_lines, text)
         return 0
 
+    def __static_text(self, value_node):
+        """Returns what writing the value prints if it is known at compile time."""
+        if not ProgramMemory.write_merging:
+            return None
+        value = value_node.static_string()
+        if value is not None:
+            return f"{value}\n"
+        status, value = evaluate_constant(value_node)
+        if status != 0 or (isinstance(value, float) and math.isnan(value)):
+            return None
+        return format_output(value)
+
+    def __write_code_text(self, output_lines, text):
+        write_bytes = ProgramMemory.use_runtime_function("@__majan_write_bytes")
+        name, size = ProgramMemory.string_constant(text)
+        output_lines.append(
+            f"call void {write_bytes}(i8* getelementptr inbounds ([{size} x i8], [{size} x i8]* @{name}, i64 0, i64 0), i64 {len(text.encode())})"
+        )
+
+    def evaluate(self, context):
+        for value_node in self.values:
+            status, value = value_node.evaluate(context)
+            if status != 0:
+                return 1, None
+            if isinstance(value, float) and math.isnan(value):
+                # printf sign of nan depends on the bits
+                return 1, None
+            text = format_output(value)
+            if not context.use_bytes(len(text)):
+                return 1, None
+            context.output.append(text)
+        return 0, None
+
+
+def format_output(value):
+    """Returns the text write prints for a value, like the runtime does."""
+    if isinstance(value, bool):
+        return "True" if value else "False"
+    if isinstance(value, int):
+        return f"{value}"
+    if isinstance(value, float):
+        return "%f" % value
+    return f"{value}\n"
+
 
 class Read(Instruction):
     def __init__(self, line_no, value) -> None:
@@ -84,36 +145,38 @@ class Read(Instruction):
 
     def write_code(self, output_lines: list):
         type, _, ident_id = ProgramMemory.variables_dict[self.left.name]
-        if type == Types.Int:
-            output_lines.append(
-                f"call i32 (i8*, ...) @scanf(i8* bitcast ([3 x i8]* @int to i8*), i32* %{ident_id})"
-            )
-            ProgramMemory.mem_counter += 1
-        if type == Types.Float:
-            output_lines.append(
-                f"call i32 (i8*, ...) @scanf(i8* bitcast ([4 x i8]* @double to i8*), double* %{ident_id})"
-            )
-            ProgramMemory.mem_counter += 1
+        ProgramMemory.known_strings.pop(self.left.name, None)
+        ProgramMemory.forget_conversion(self.left.name)
+        # The old value is passed in and kept when the input has no value,
+        # like scanf does, so the variable can still live in a register
+        read_function, llvm_type = {
+            Types.Int: ("@__majan_read_int", "i32"),
+            Types.Float: ("@__majan_read_double", "double"),
+            Types.String: ("@__majan_read_string", "%string"),
+        }[type]
+        read_function = ProgramMemory.use_runtime_function(read_function)
+        old = ProgramMemory.increment_and_read_mem()
+        output_lines.append(f"%{old} = load {llvm_type}, {llvm_type}* %{ident_id}")
+        arguments = f"{llvm_type} %{old}"
         if type == Types.String:
-            output_lines.append(
-                f"%{ProgramMemory.mem_counter} = alloca [{ProgramMemory.buffer_size + 1} x i8]"
-            )
-            mem_str = ProgramMemory.mem_counter
-            ProgramMemory.mem_counter += 1
-            output_lines.append(
-                f"%{ProgramMemory.mem_counter} = getelementptr inbounds [{ProgramMemory.buffer_size + 1} x i8], [{ProgramMemory.buffer_size + 1} x i8]* %{mem_str}, i64 0, i64 0"
-            )
-            ProgramMemory.mem_counter += 1
-            output_lines.append(
-                f"store i8* %{ProgramMemory.mem_counter - 1}, i8** %{ident_id}"
-            )
-            output_lines.append(
-                f"%{ProgramMemory.mem_counter} = call i32 (i8*, ...) @scanf(i8* getelementptr inbounds ([5 x i8], [5 x i8]* @strs, i32 0, i32 0), i8* %{ProgramMemory.mem_counter - 1})"
-            )
-            ProgramMemory.mem_counter += 1
-            ProgramMemory.variables_dict[self.left.name] = (
-                type,
-                ProgramMemory.buffer_size,
-                ident_id,
-            )
+            # The read buffer is owned by the variable, see Assign
+            arguments += f", i64* %{self.left.name}.capacity"
+        new = ProgramMemory.increment_and_read_mem()
+        output_lines.append(f"%{new} = call {llvm_type} {read_function}({arguments})")
+        output_lines.append(f"store {llvm_type} %{new}, {llvm_type}* %{ident_id}")
         return 0
+
+    def allocated_variables(self):
+        return {self.left.name}
+
+    def assigned_variables(self):
+        return {self.left.name}
+
+    def live_variables(self, live):
+        # The old value is only kept when the input has no value, it does
+        # not matter unless the variable is read later
+        return live
+
+    def evaluate(self, context):
+        # Input is only known at runtime
+        return 1, None
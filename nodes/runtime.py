@@ -0,0 +1,934 @@
+# Helper functions emitted into the module next to main, only when used.
+# They rely on the types and declarations from the header of the module.
+
+runtime_functions = {
+    # Appends length bytes from data to a string in place. The capacity is
+    # the size of the buffer owned by the appended variable, 0 when the
+    # buffer is not owned, e.g. a literal or a value shared with another
+    # variable. A full buffer is copied to one twice as large. The old one
+    # is freed when it is owned, unless it is kept, the buffer the
+    # statement started with, which operands may point into and which the
+    # caller releases once everything is appended.
+    "@__majan_append": [
+        "define private %string @__majan_append(%string %value, i64* %capacity, i8* %kept, i8* %data, i64 %length) {",
+        "entry:",
+        "%pointer = extractvalue %string %value, 0",
+        "%size = extractvalue %string %value, 1",
+        "%new_size = add i64 %size, %length",
+        "%needed = add i64 %new_size, 1",
+        "%current = load i64, i64* %capacity",
+        "%fits = icmp ule i64 %needed, %current",
+        "br i1 %fits, label %append, label %grow",
+        "grow:",
+        "%doubled = shl i64 %current, 1",
+        "%is_enough = icmp uge i64 %doubled, %needed",
+        "%grown = select i1 %is_enough, i64 %doubled, i64 %needed",
+        "%is_small = icmp ult i64 %grown, 16",
+        "%new_capacity = select i1 %is_small, i64 16, i64 %grown",
+        "%buffer = call i8* @malloc(i64 %new_capacity)",
+        "call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %buffer, i8* align 1 %pointer, i64 %size, i1 false)",
+        "store i64 %new_capacity, i64* %capacity",
+        "%is_owned = icmp ne i64 %current, 0",
+        "%is_kept = icmp eq i8* %pointer, %kept",
+        "%is_kept_or_shared = select i1 %is_owned, i1 %is_kept, i1 true",
+        "br i1 %is_kept_or_shared, label %append, label %release",
+        "release:",
+        "call void @free(i8* %pointer)",
+        "br label %append",
+        "append:",
+        "%target = phi i8* [%pointer, %entry], [%buffer, %grow], [%buffer, %release]",
+        "%end = getelementptr inbounds i8, i8* %target, i64 %size",
+        "call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %end, i8* align 1 %data, i64 %length, i1 false)",
+        "%terminator = getelementptr inbounds i8, i8* %target, i64 %new_size",
+        "store i8 0, i8* %terminator",
+        "%with_pointer = insertvalue %string undef, i8* %target, 0",
+        "%result = insertvalue %string %with_pointer, i64 %new_size, 1",
+        "ret %string %result",
+        "}",
+        "",
+    ],
+    # Frees the old buffer of a variable that now holds the new string,
+    # when the variable owned the buffer, i.e. its capacity was not 0, and
+    # the new string is not in the same buffer
+    "@__majan_release": [
+        "define private void @__majan_release(%string %old, i64 %capacity, %string %new) {",
+        "entry:",
+        "%is_owned = icmp ne i64 %capacity, 0",
+        "br i1 %is_owned, label %compare, label %done",
+        "compare:",
+        "%old_pointer = extractvalue %string %old, 0",
+        "%new_pointer = extractvalue %string %new, 0",
+        "%is_moved = icmp ne i8* %old_pointer, %new_pointer",
+        "br i1 %is_moved, label %release, label %done",
+        "release:",
+        "call void @free(i8* %old_pointer)",
+        "br label %done",
+        "done:",
+        "ret void",
+        "}",
+        "",
+    ],
+    # Copies both strings and a terminating zero into buffer, which the
+    # caller allocates with room for them, on the stack for temporaries
+    "@__majan_concat": [
+        "define private %string @__majan_concat(i8* %buffer, %string %left, %string %right) {",
+        "entry:",
+        "%left_pointer = extractvalue %string %left, 0",
+        "%left_length = extractvalue %string %left, 1",
+        "%right_pointer = extractvalue %string %right, 0",
+        "%right_length = extractvalue %string %right, 1",
+        "call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %buffer, i8* align 1 %left_pointer, i64 %left_length, i1 false)",
+        "%right_start = getelementptr inbounds i8, i8* %buffer, i64 %left_length",
+        "call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %right_start, i8* align 1 %right_pointer, i64 %right_length, i1 false)",
+        "%length = add i64 %left_length, %right_length",
+        "%end = getelementptr inbounds i8, i8* %buffer, i64 %length",
+        "store i8 0, i8* %end",
+        "%with_pointer = insertvalue %string undef, i8* %buffer, 0",
+        "%result = insertvalue %string %with_pointer, i64 %length, 1",
+        "ret %string %result",
+        "}",
+        "",
+    ],
+    # Output goes through one buffer that is flushed when it is full, before
+    # waiting for input and at the end of main, instead of a printf call
+    # per write
+    "@__majan_output": [
+        "@__majan_output = internal global [65536 x i8] zeroinitializer",
+        "@__majan_output_size = internal global i64 0",
+        "",
+    ],
+    "@__majan_write_all": [
+        "define private void @__majan_write_all(i8* %data, i64 %length) {",
+        "entry:",
+        "br label %check",
+        "check:",
+        "%written = phi i64 [0, %entry], [%next, %advance]",
+        "%more = icmp ult i64 %written, %length",
+        "br i1 %more, label %write, label %done",
+        "write:",
+        "%start = getelementptr inbounds i8, i8* %data, i64 %written",
+        "%left = sub i64 %length, %written",
+        "%count = call i64 @write(i32 1, i8* %start, i64 %left)",
+        "%failed = icmp slt i64 %count, 1",
+        "br i1 %failed, label %done, label %advance",
+        "advance:",
+        "%next = add i64 %written, %count",
+        "br label %check",
+        "done:",
+        "ret void",
+        "}",
+        "",
+    ],
+    "@__majan_flush": [
+        "define private void @__majan_flush() {",
+        "entry:",
+        "%size = load i64, i64* @__majan_output_size",
+        "call void @__majan_write_all(i8* getelementptr inbounds ([65536 x i8], [65536 x i8]* @__majan_output, i64 0, i64 0), i64 %size)",
+        "store i64 0, i64* @__majan_output_size",
+        "ret void",
+        "}",
+        "",
+    ],
+    "@__majan_write_bytes": [
+        "define private void @__majan_write_bytes(i8* %data, i64 %length) {",
+        "entry:",
+        "%size = load i64, i64* @__majan_output_size",
+        "%new_size = add i64 %size, %length",
+        "%fits = icmp ule i64 %new_size, 65536",
+        "br i1 %fits, label %copy, label %flush",
+        "flush:",
+        "call void @__majan_flush()",
+        "%is_small = icmp ule i64 %length, 65536",
+        "br i1 %is_small, label %copy, label %direct",
+        "direct:",
+        "call void @__majan_write_all(i8* %data, i64 %length)",
+        "ret void",
+        "copy:",
+        "%start = phi i64 [%size, %entry], [0, %flush]",
+        "%target = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_output, i64 0, i64 %start",
+        "call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %target, i8* align 1 %data, i64 %length, i1 false)",
+        "%end = add i64 %start, %length",
+        "store i64 %end, i64* @__majan_output_size",
+        "ret void",
+        "}",
+        "",
+    ],
+    "@__majan_write_string": [
+        "define private void @__majan_write_string(i8* %data, i64 %length) {",
+        "entry:",
+        "%newline = alloca i8",
+        "store i8 10, i8* %newline",
+        "call void @__majan_write_bytes(i8* %data, i64 %length)",
+        "call void @__majan_write_bytes(i8* %newline, i64 1)",
+        "ret void",
+        "}",
+        "",
+    ],
+    "@__majan_write_bool": [
+        "define private void @__majan_write_bool(i1 %value) {",
+        "entry:",
+        "%text = select i1 %value, i8* getelementptr inbounds ([5 x i8], [5 x i8]* @True, i64 0, i64 0), i8* getelementptr inbounds ([6 x i8], [6 x i8]* @False, i64 0, i64 0)",
+        "%length = select i1 %value, i64 4, i64 5",
+        "call void @__majan_write_bytes(i8* %text, i64 %length)",
+        "ret void",
+        "}",
+        "",
+    ],
+    # Writes the decimal digits of value right before end, returns the
+    # position of the first digit
+    "@__majan_format_unsigned": [
+        "define private i8* @__majan_format_unsigned(i64 %value, i8* %end) {",
+        "entry:",
+        "br label %digit",
+        "digit:",
+        "%rest = phi i64 [%value, %entry], [%quotient, %digit]",
+        "%position = phi i8* [%end, %entry], [%first, %digit]",
+        "%quotient = udiv i64 %rest, 10",
+        "%tens = mul i64 %quotient, 10",
+        "%remainder = sub i64 %rest, %tens",
+        "%remainder_byte = trunc i64 %remainder to i8",
+        "%character = add i8 %remainder_byte, 48",
+        "%first = getelementptr inbounds i8, i8* %position, i64 -1",
+        "store i8 %character, i8* %first",
+        "%is_last = icmp eq i64 %quotient, 0",
+        "br i1 %is_last, label %done, label %digit",
+        "done:",
+        "ret i8* %first",
+        "}",
+        "",
+    ],
+    "@__majan_write_int": [
+        "define private void @__majan_write_int(i32 %value) {",
+        "entry:",
+        "%text = alloca [24 x i8]",
+        "%end = getelementptr inbounds [24 x i8], [24 x i8]* %text, i64 0, i64 24",
+        "%wide = sext i32 %value to i64",
+        "%is_negative = icmp slt i64 %wide, 0",
+        "%negated = sub i64 0, %wide",
+        "%magnitude = select i1 %is_negative, i64 %negated, i64 %wide",
+        "%digits = call i8* @__majan_format_unsigned(i64 %magnitude, i8* %end)",
+        "%minus = getelementptr inbounds i8, i8* %digits, i64 -1",
+        "store i8 45, i8* %minus",
+        "%start = select i1 %is_negative, i8* %minus, i8* %digits",
+        "%start_address = ptrtoint i8* %start to i64",
+        "%end_address = ptrtoint i8* %end to i64",
+        "%length = sub i64 %end_address, %start_address",
+        "call void @__majan_write_bytes(i8* %start, i64 %length)",
+        "ret void",
+        "}",
+        "",
+    ],
+    # Prints like printf %f. Below 2**63 the fraction is taken as a 128 bit
+    # fixed point number, which is exact for every double that can round to
+    # a nonzero sixth digit, and rounded half to even. Larger values, inf
+    # and nan go to snprintf.
+    "@__majan_write_double": [
+        "define private void @__majan_write_double(double %value) {",
+        "entry:",
+        "%text = alloca [400 x i8]",
+        "%text_start = getelementptr inbounds [400 x i8], [400 x i8]* %text, i64 0, i64 0",
+        "%bits = bitcast double %value to i64",
+        "%is_negative = icmp slt i64 %bits, 0",
+        "%negated = fneg double %value",
+        "%magnitude = select i1 %is_negative, double %negated, double %value",
+        "%is_fixed = fcmp olt double %magnitude, 0x43E0000000000000",
+        "br i1 %is_fixed, label %fixed, label %fallback",
+        "fallback:",
+        "%count = call i32 (i8*, i64, i8*, ...) @snprintf(i8* %text_start, i64 400, i8* getelementptr inbounds ([4 x i8], [4 x i8]* @double, i64 0, i64 0), double %value)",
+        "%count_wide = zext i32 %count to i64",
+        "call void @__majan_write_bytes(i8* %text_start, i64 %count_wide)",
+        "ret void",
+        "fixed:",
+        "%integer = fptoui double %magnitude to i64",
+        "%integer_value = uitofp i64 %integer to double",
+        "%fraction = fsub double %magnitude, %integer_value",
+        "%scaled = fmul double %fraction, 0x43F0000000000000",
+        "%high = fptoui double %scaled to i64",
+        "%high_value = uitofp i64 %high to double",
+        "%rest = fsub double %scaled, %high_value",
+        "%rest_scaled = fmul double %rest, 0x43F0000000000000",
+        "%low = fptoui double %rest_scaled to i64",
+        "%high_wide = zext i64 %high to i128",
+        "%low_wide = zext i64 %low to i128",
+        "%high_micros = mul i128 %high_wide, 1000000",
+        "%low_micros = mul i128 %low_wide, 1000000",
+        "%low_carry = lshr i128 %low_micros, 64",
+        "%sum = add i128 %high_micros, %low_carry",
+        "%micros_wide = lshr i128 %sum, 64",
+        "%micros = trunc i128 %micros_wide to i64",
+        "%upper_rest = trunc i128 %sum to i64",
+        "%lower_rest = trunc i128 %low_micros to i64",
+        "%is_above_half = icmp ugt i64 %upper_rest, -9223372036854775808",
+        "%is_at_half = icmp eq i64 %upper_rest, -9223372036854775808",
+        "%has_lower_rest = icmp ne i64 %lower_rest, 0",
+        "%is_odd = trunc i64 %micros to i1",
+        "%breaks_tie = or i1 %has_lower_rest, %is_odd",
+        "%rounds_at_half = and i1 %is_at_half, %breaks_tie",
+        "%rounds_up = or i1 %is_above_half, %rounds_at_half",
+        "%round_up = zext i1 %rounds_up to i64",
+        "%rounded = add i64 %micros, %round_up",
+        "%carries = icmp eq i64 %rounded, 1000000",
+        "%next_integer = add i64 %integer, 1",
+        "%integer_part = select i1 %carries, i64 %next_integer, i64 %integer",
+        "%fraction_part = select i1 %carries, i64 0, i64 %rounded",
+        "%end = getelementptr inbounds [400 x i8], [400 x i8]* %text, i64 0, i64 400",
+        "%padded = add i64 %fraction_part, 1000000",
+        "%point = call i8* @__majan_format_unsigned(i64 %padded, i8* %end)",
+        "store i8 46, i8* %point",
+        "%digits = call i8* @__majan_format_unsigned(i64 %integer_part, i8* %point)",
+        "%minus = getelementptr inbounds i8, i8* %digits, i64 -1",
+        "store i8 45, i8* %minus",
+        "%start = select i1 %is_negative, i8* %minus, i8* %digits",
+        "%start_address = ptrtoint i8* %start to i64",
+        "%end_address = ptrtoint i8* %end to i64",
+        "%length = sub i64 %end_address, %start_address",
+        "call void @__majan_write_bytes(i8* %start, i64 %length)",
+        "ret void",
+        "}",
+        "",
+    ],
+    # Input is read from stdin in blocks, ints, floats and strings are
+    # parsed from the block instead of calling scanf for every read
+    "@__majan_input": [
+        "@__majan_input = internal global [65536 x i8] zeroinitializer",
+        "@__majan_input_position = internal global i64 0",
+        "@__majan_input_size = internal global i64 0",
+        "",
+    ],
+    # Returns the next input byte without consuming it, -1 at the end.
+    # Prompts written so far have to be visible before waiting for input.
+    "@__majan_peek": [
+        "define private i32 @__majan_peek() {",
+        "entry:",
+        "%position = load i64, i64* @__majan_input_position",
+        "%size = load i64, i64* @__majan_input_size",
+        "%is_buffered = icmp ult i64 %position, %size",
+        "br i1 %is_buffered, label %byte, label %fill",
+        "fill:",
+        "call void @__majan_flush()",
+        "%count = call i64 @read(i32 0, i8* getelementptr inbounds ([65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 0), i64 65536)",
+        "%has_input = icmp sgt i64 %count, 0",
+        "%new_size = select i1 %has_input, i64 %count, i64 0",
+        "store i64 0, i64* @__majan_input_position",
+        "store i64 %new_size, i64* @__majan_input_size",
+        "br i1 %has_input, label %byte, label %end",
+        "byte:",
+        "%at = phi i64 [%position, %entry], [0, %fill]",
+        "%address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %at",
+        "%character = load i8, i8* %address",
+        "%value = zext i8 %character to i32",
+        "ret i32 %value",
+        "end:",
+        "ret i32 -1",
+        "}",
+        "",
+    ],
+    "@__majan_advance": [
+        "define private void @__majan_advance() {",
+        "entry:",
+        "%position = load i64, i64* @__majan_input_position",
+        "%next = add i64 %position, 1",
+        "store i64 %next, i64* @__majan_input_position",
+        "ret void",
+        "}",
+        "",
+    ],
+    "@__majan_is_space": [
+        "define private i1 @__majan_is_space(i32 %character) {",
+        "entry:",
+        "%is_blank = icmp eq i32 %character, 32",
+        "%control = sub i32 %character, 9",
+        "%is_control = icmp ult i32 %control, 5",
+        "%is_space = or i1 %is_blank, %is_control",
+        "ret i1 %is_space",
+        "}",
+        "",
+    ],
+    "@__majan_skip_space": [
+        "define private void @__majan_skip_space() {",
+        "entry:",
+        "br label %block",
+        "block:",
+        "%character = call i32 @__majan_peek()",
+        "%is_end = icmp eq i32 %character, -1",
+        "br i1 %is_end, label %done, label %scan_start",
+        "scan_start:",
+        "%start = load i64, i64* @__majan_input_position",
+        "%size = load i64, i64* @__majan_input_size",
+        "br label %scan",
+        "scan:",
+        "%index = phi i64 [%start, %scan_start], [%next, %skip]",
+        "%is_buffered = icmp ult i64 %index, %size",
+        "br i1 %is_buffered, label %byte, label %refill",
+        "byte:",
+        "%address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %index",
+        "%byte_value = load i8, i8* %address",
+        "%byte_wide = zext i8 %byte_value to i32",
+        "%is_space = call i1 @__majan_is_space(i32 %byte_wide)",
+        "br i1 %is_space, label %skip, label %stop",
+        "skip:",
+        "%next = add i64 %index, 1",
+        "br label %scan",
+        "refill:",
+        "store i64 %index, i64* @__majan_input_position",
+        "br label %block",
+        "stop:",
+        "store i64 %index, i64* @__majan_input_position",
+        "br label %done",
+        "done:",
+        "ret void",
+        "}",
+        "",
+    ],
+    # Parses a number that lies in the input block without a call per
+    # character. Anything else, e.g. a number split between two blocks, is
+    # left to @__majan_parse_int, nothing is consumed before that.
+    "@__majan_read_int": [
+        "define private i32 @__majan_read_int(i32 %old) {",
+        "entry:",
+        "call void @__majan_skip_space()",
+        "%first = call i32 @__majan_peek()",
+        "%start = load i64, i64* @__majan_input_position",
+        "%size = load i64, i64* @__majan_input_size",
+        "%is_minus = icmp eq i32 %first, 45",
+        "%is_plus = icmp eq i32 %first, 43",
+        "%has_sign = or i1 %is_minus, %is_plus",
+        "%sign_length = zext i1 %has_sign to i64",
+        "%digits_start = add i64 %start, %sign_length",
+        "br label %scan",
+        "scan:",
+        "%index = phi i64 [%digits_start, %entry], [%next, %digit]",
+        "%value = phi i64 [0, %entry], [%next_value, %digit]",
+        "%is_buffered = icmp ult i64 %index, %size",
+        "br i1 %is_buffered, label %byte, label %slow",
+        "byte:",
+        "%address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %index",
+        "%character = load i8, i8* %address",
+        "%character_wide = zext i8 %character to i64",
+        "%digit_value = sub i64 %character_wide, 48",
+        "%is_digit = icmp ult i64 %digit_value, 10",
+        "br i1 %is_digit, label %digit, label %stop",
+        "digit:",
+        "%tens = mul i64 %value, 10",
+        "%next_value = add i64 %tens, %digit_value",
+        "%next = add i64 %index, 1",
+        "br label %scan",
+        "stop:",
+        "%is_missing = icmp eq i64 %index, %digits_start",
+        "br i1 %is_missing, label %slow, label %done",
+        "done:",
+        "store i64 %index, i64* @__majan_input_position",
+        "%negated = sub i64 0, %value",
+        "%signed = select i1 %is_minus, i64 %negated, i64 %value",
+        "%result = trunc i64 %signed to i32",
+        "ret i32 %result",
+        "slow:",
+        "%parsed = call i32 @__majan_parse_int(i32 %old)",
+        "ret i32 %parsed",
+        "}",
+        "",
+    ],
+    # Parses a decimal number that lies in the input block and converts
+    # exactly without a call per character, see @__majan_parse_double.
+    "@__majan_read_double": [
+        "define private double @__majan_read_double(double %old) {",
+        "entry:",
+        "call void @__majan_skip_space()",
+        "%first = call i32 @__majan_peek()",
+        "%start = load i64, i64* @__majan_input_position",
+        "%size = load i64, i64* @__majan_input_size",
+        "%is_minus = icmp eq i32 %first, 45",
+        "%is_plus = icmp eq i32 %first, 43",
+        "%has_sign = or i1 %is_minus, %is_plus",
+        "%sign_length = zext i1 %has_sign to i64",
+        "%integer_start = add i64 %start, %sign_length",
+        "br label %integer",
+        "integer:",
+        "%integer_index = phi i64 [%integer_start, %entry], [%integer_next, %integer_digit]",
+        "%integer_value = phi i64 [0, %entry], [%integer_next_value, %integer_digit]",
+        "%integer_is_buffered = icmp ult i64 %integer_index, %size",
+        "br i1 %integer_is_buffered, label %integer_byte, label %slow",
+        "integer_byte:",
+        "%integer_address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %integer_index",
+        "%integer_character = load i8, i8* %integer_address",
+        "%integer_wide = zext i8 %integer_character to i64",
+        "%integer_digit_value = sub i64 %integer_wide, 48",
+        "%is_integer_digit = icmp ult i64 %integer_digit_value, 10",
+        "br i1 %is_integer_digit, label %integer_digit, label %point",
+        "integer_digit:",
+        "%integer_has_room = icmp ult i64 %integer_value, 100000000000000000",
+        "%integer_tens = mul i64 %integer_value, 10",
+        "%integer_next_value = add i64 %integer_tens, %integer_digit_value",
+        "%integer_next = add i64 %integer_index, 1",
+        "br i1 %integer_has_room, label %integer, label %slow",
+        "point:",
+        "%is_point = icmp eq i64 %integer_wide, 46",
+        "%fraction_start = add i64 %integer_index, 1",
+        "br i1 %is_point, label %fraction, label %exponent_mark",
+        "fraction:",
+        "%fraction_index = phi i64 [%fraction_start, %point], [%fraction_next, %fraction_digit]",
+        "%fraction_value = phi i64 [%integer_value, %point], [%fraction_next_value, %fraction_digit]",
+        "%fraction_scale = phi i64 [0, %point], [%fraction_next_scale, %fraction_digit]",
+        "%fraction_is_buffered = icmp ult i64 %fraction_index, %size",
+        "br i1 %fraction_is_buffered, label %fraction_byte, label %slow",
+        "fraction_byte:",
+        "%fraction_address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %fraction_index",
+        "%fraction_character = load i8, i8* %fraction_address",
+        "%fraction_wide = zext i8 %fraction_character to i64",
+        "%fraction_digit_value = sub i64 %fraction_wide, 48",
+        "%is_fraction_digit = icmp ult i64 %fraction_digit_value, 10",
+        "br i1 %is_fraction_digit, label %fraction_digit, label %exponent_mark",
+        "fraction_digit:",
+        "%fraction_has_room = icmp ult i64 %fraction_value, 100000000000000000",
+        "%fraction_tens = mul i64 %fraction_value, 10",
+        "%fraction_next_value = add i64 %fraction_tens, %fraction_digit_value",
+        "%fraction_next_scale = sub i64 %fraction_scale, 1",
+        "%fraction_next = add i64 %fraction_index, 1",
+        "br i1 %fraction_has_room, label %fraction, label %slow",
+        "exponent_mark:",
+        "%mark_index = phi i64 [%integer_index, %point], [%fraction_index, %fraction_byte]",
+        "%mark = phi i64 [%integer_wide, %point], [%fraction_wide, %fraction_byte]",
+        "%mantissa = phi i64 [%integer_value, %point], [%fraction_value, %fraction_byte]",
+        "%scale = phi i64 [0, %point], [%fraction_scale, %fraction_byte]",
+        "%digit_count = sub i64 %mark_index, %integer_start",
+        "%point_length = zext i1 %is_point to i64",
+        "%mantissa_digits = sub i64 %digit_count, %point_length",
+        "%is_missing = icmp eq i64 %mantissa_digits, 0",
+        "br i1 %is_missing, label %slow, label %exponent_check",
+        "exponent_check:",
+        "%is_lower_e = icmp eq i64 %mark, 101",
+        "%is_upper_e = icmp eq i64 %mark, 69",
+        "%is_e = or i1 %is_lower_e, %is_upper_e",
+        "br i1 %is_e, label %exponent_sign, label %convert",
+        "exponent_sign:",
+        "%sign_index = add i64 %mark_index, 1",
+        "%sign_is_buffered = icmp ult i64 %sign_index, %size",
+        "br i1 %sign_is_buffered, label %exponent_sign_byte, label %slow",
+        "exponent_sign_byte:",
+        "%sign_address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %sign_index",
+        "%sign_character = load i8, i8* %sign_address",
+        "%is_exponent_minus = icmp eq i8 %sign_character, 45",
+        "%is_exponent_plus = icmp eq i8 %sign_character, 43",
+        "%has_exponent_sign = or i1 %is_exponent_minus, %is_exponent_plus",
+        "%exponent_sign_length = zext i1 %has_exponent_sign to i64",
+        "%exponent_start = add i64 %sign_index, %exponent_sign_length",
+        "br label %exponent",
+        "exponent:",
+        "%exponent_index = phi i64 [%exponent_start, %exponent_sign_byte], [%exponent_next, %exponent_digit]",
+        "%exponent_value = phi i64 [0, %exponent_sign_byte], [%exponent_capped, %exponent_digit]",
+        "%exponent_is_buffered = icmp ult i64 %exponent_index, %size",
+        "br i1 %exponent_is_buffered, label %exponent_byte, label %slow",
+        "exponent_byte:",
+        "%exponent_address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %exponent_index",
+        "%exponent_character = load i8, i8* %exponent_address",
+        "%exponent_wide = zext i8 %exponent_character to i64",
+        "%exponent_digit_value = sub i64 %exponent_wide, 48",
+        "%is_exponent_digit = icmp ult i64 %exponent_digit_value, 10",
+        "br i1 %is_exponent_digit, label %exponent_digit, label %exponent_done",
+        "exponent_digit:",
+        "%exponent_tens = mul i64 %exponent_value, 10",
+        "%exponent_sum = add i64 %exponent_tens, %exponent_digit_value",
+        "%is_exponent_large = icmp ugt i64 %exponent_sum, 100000",
+        "%exponent_capped = select i1 %is_exponent_large, i64 100000, i64 %exponent_sum",
+        "%exponent_next = add i64 %exponent_index, 1",
+        "br label %exponent",
+        "exponent_done:",
+        "%has_exponent = icmp ugt i64 %exponent_index, %exponent_start",
+        "%exponent_negated = sub i64 0, %exponent_value",
+        "%exponent_signed = select i1 %is_exponent_minus, i64 %exponent_negated, i64 %exponent_value",
+        "br i1 %has_exponent, label %convert, label %slow",
+        "convert:",
+        "%end = phi i64 [%mark_index, %exponent_check], [%exponent_index, %exponent_done]",
+        "%written = phi i64 [0, %exponent_check], [%exponent_signed, %exponent_done]",
+        "%delimiter = phi i64 [%mark, %exponent_check], [%exponent_wide, %exponent_done]",
+        "%delimiter_narrow = trunc i64 %delimiter to i32",
+        "%is_delimited = call i1 @__majan_is_space(i32 %delimiter_narrow)",
+        "%decimal_exponent = add i64 %scale, %written",
+        "%is_small = icmp ult i64 %mantissa, 9007199254740992",
+        "%shifted_exponent = add i64 %decimal_exponent, 22",
+        "%is_exact_power = icmp ule i64 %shifted_exponent, 44",
+        "%is_exact = and i1 %is_small, %is_exact_power",
+        "%is_fast = and i1 %is_exact, %is_delimited",
+        "br i1 %is_fast, label %fast, label %slow",
+        "fast:",
+        "store i64 %end, i64* @__majan_input_position",
+        "%value_double = uitofp i64 %mantissa to double",
+        "%is_division = icmp slt i64 %decimal_exponent, 0",
+        "%negative_exponent = sub i64 0, %decimal_exponent",
+        "%power_index = select i1 %is_division, i64 %negative_exponent, i64 %decimal_exponent",
+        "%power_address = getelementptr inbounds [23 x double], [23 x double]* @__majan_powers_of_ten, i64 0, i64 %power_index",
+        "%power = load double, double* %power_address",
+        "%product = fmul double %value_double, %power",
+        "%quotient = fdiv double %value_double, %power",
+        "%magnitude = select i1 %is_division, double %quotient, double %product",
+        "%negated = fneg double %magnitude",
+        "%result = select i1 %is_minus, double %negated, double %magnitude",
+        "ret double %result",
+        "slow:",
+        "%parsed = call double @__majan_parse_double(double %old)",
+        "ret double %parsed",
+        "}",
+        "",
+    ],
+    # Like scanf %d, the old value is kept when there is no number. Reads
+    # one character at a time, see @__majan_read_int for the common case.
+    "@__majan_parse_int": [
+        "define private i32 @__majan_parse_int(i32 %old) {",
+        "entry:",
+        "call void @__majan_skip_space()",
+        "%first = call i32 @__majan_peek()",
+        "%is_minus = icmp eq i32 %first, 45",
+        "%is_plus = icmp eq i32 %first, 43",
+        "%has_sign = or i1 %is_minus, %is_plus",
+        "br i1 %has_sign, label %sign, label %digits",
+        "sign:",
+        "call void @__majan_advance()",
+        "br label %digits",
+        "digits:",
+        "br label %digit",
+        "digit:",
+        "%value = phi i64 [0, %digits], [%next, %accumulate]",
+        "%count = phi i64 [0, %digits], [%next_count, %accumulate]",
+        "%character = call i32 @__majan_peek()",
+        "%digit_value = sub i32 %character, 48",
+        "%is_digit = icmp ult i32 %digit_value, 10",
+        "br i1 %is_digit, label %accumulate, label %done",
+        "accumulate:",
+        "call void @__majan_advance()",
+        "%digit_wide = zext i32 %digit_value to i64",
+        "%tens = mul i64 %value, 10",
+        "%next = add i64 %tens, %digit_wide",
+        "%next_count = add i64 %count, 1",
+        "br label %digit",
+        "done:",
+        "%is_missing = icmp eq i64 %count, 0",
+        "%negated = sub i64 0, %value",
+        "%signed = select i1 %is_minus, i64 %negated, i64 %value",
+        "%result = trunc i64 %signed to i32",
+        "%final = select i1 %is_missing, i32 %old, i32 %result",
+        "ret i32 %final",
+        "}",
+        "",
+    ],
+    # Reads a whitespace delimited word of any length into a heap buffer,
+    # copying whole runs of the input block at once. The buffer replaces
+    # the old one of the variable, whose capacity is owned.
+    "@__majan_read_string": [
+        "define private %string @__majan_read_string(%string %old, i64* %owned) {",
+        "entry:",
+        "call void @__majan_skip_space()",
+        "%initial = call i8* @malloc(i64 16)",
+        "br label %chunk",
+        "chunk:",
+        "%buffer = phi i8* [%initial, %entry], [%target, %copy]",
+        "%capacity = phi i64 [16, %entry], [%new_capacity, %copy]",
+        "%length = phi i64 [0, %entry], [%new_length, %copy]",
+        "%character = call i32 @__majan_peek()",
+        "%is_end = icmp eq i32 %character, -1",
+        "br i1 %is_end, label %done, label %scan_start",
+        "scan_start:",
+        "%start = load i64, i64* @__majan_input_position",
+        "%size = load i64, i64* @__majan_input_size",
+        "br label %scan",
+        "scan:",
+        "%index = phi i64 [%start, %scan_start], [%next_index, %scan_next]",
+        "%is_buffered = icmp ult i64 %index, %size",
+        "br i1 %is_buffered, label %scan_byte, label %append",
+        "scan_byte:",
+        "%address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %index",
+        "%byte = load i8, i8* %address",
+        "%byte_value = zext i8 %byte to i32",
+        "%is_space = call i1 @__majan_is_space(i32 %byte_value)",
+        "br i1 %is_space, label %append, label %scan_next",
+        "scan_next:",
+        "%next_index = add i64 %index, 1",
+        "br label %scan",
+        "append:",
+        "%end = phi i64 [%index, %scan], [%index, %scan_byte]",
+        "%is_word_end = phi i1 [false, %scan], [true, %scan_byte]",
+        "%count = sub i64 %end, %start",
+        "%new_length = add i64 %length, %count",
+        "%needed = add i64 %new_length, 1",
+        "%fits = icmp ule i64 %needed, %capacity",
+        "br i1 %fits, label %copy, label %grow",
+        "grow:",
+        "%doubled = shl i64 %capacity, 1",
+        "%is_enough = icmp uge i64 %doubled, %needed",
+        "%grown = select i1 %is_enough, i64 %doubled, i64 %needed",
+        "%larger = call i8* @malloc(i64 %grown)",
+        "call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %larger, i8* align 1 %buffer, i64 %length, i1 false)",
+        "call void @free(i8* %buffer)",
+        "br label %copy",
+        "copy:",
+        "%target = phi i8* [%buffer, %append], [%larger, %grow]",
+        "%new_capacity = phi i64 [%capacity, %append], [%grown, %grow]",
+        "%destination = getelementptr inbounds i8, i8* %target, i64 %length",
+        "%source = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %start",
+        "call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %destination, i8* align 1 %source, i64 %count, i1 false)",
+        "store i64 %end, i64* @__majan_input_position",
+        "br i1 %is_word_end, label %done, label %chunk",
+        "done:",
+        "%result_buffer = phi i8* [%buffer, %chunk], [%target, %copy]",
+        "%result_capacity = phi i64 [%capacity, %chunk], [%new_capacity, %copy]",
+        "%result_length = phi i64 [%length, %chunk], [%new_length, %copy]",
+        "%is_missing = icmp eq i64 %result_length, 0",
+        "br i1 %is_missing, label %missing, label %found",
+        "missing:",
+        "call void @free(i8* %result_buffer)",
+        "ret %string %old",
+        "found:",
+        "%terminator = getelementptr inbounds i8, i8* %result_buffer, i64 %result_length",
+        "store i8 0, i8* %terminator",
+        "%with_pointer = insertvalue %string undef, i8* %result_buffer, 0",
+        "%result = insertvalue %string %with_pointer, i64 %result_length, 1",
+        "%old_capacity = load i64, i64* %owned",
+        "call void @__majan_release(%string %old, i64 %old_capacity, %string %result)",
+        "store i64 %result_capacity, i64* %owned",
+        "ret %string %result",
+        "}",
+        "",
+    ],
+    "@__majan_powers_of_ten": [
+        "@__majan_powers_of_ten = private constant [23 x double] [double 1.0, double 10.0, double 100.0, double 1000.0, double 10000.0, double 100000.0, double 1000000.0, double 10000000.0, double 100000000.0, double 1000000000.0, double 10000000000.0, double 100000000000.0, double 1000000000000.0, double 10000000000000.0, double 100000000000000.0, double 1000000000000000.0, double 10000000000000000.0, double 100000000000000000.0, double 1000000000000000000.0, double 10000000000000000000.0, double 100000000000000000000.0, double 1000000000000000000000.0, double 10000000000000000000000.0]",
+        "",
+    ],
+    # Consumes the next input byte, keeping it in the token for strtod
+    "@__majan_keep": [
+        "define private void @__majan_keep(i8* %token, i64* %token_length, i32 %character) {",
+        "entry:",
+        "%length = load i64, i64* %token_length",
+        "%has_room = icmp ult i64 %length, 511",
+        "br i1 %has_room, label %store, label %done",
+        "store:",
+        "%address = getelementptr inbounds i8, i8* %token, i64 %length",
+        "%byte = trunc i32 %character to i8",
+        "store i8 %byte, i8* %address",
+        "%next = add i64 %length, 1",
+        "store i64 %next, i64* %token_length",
+        "br label %done",
+        "done:",
+        "call void @__majan_advance()",
+        "ret void",
+        "}",
+        "",
+    ],
+    # Adds a digit to the mantissa, digits that do not fit anymore only
+    # scale the number and make it inexact when they are not zero
+    "@__majan_accumulate": [
+        "define private void @__majan_accumulate(i64* %mantissa, i64* %exponent, i1* %is_inexact, i32 %digit, i64 %shift) {",
+        "entry:",
+        "%value = load i64, i64* %mantissa",
+        "%scale = load i64, i64* %exponent",
+        "%has_room = icmp ult i64 %value, 100000000000000000",
+        "br i1 %has_room, label %add, label %drop",
+        "add:",
+        "%digit_wide = zext i32 %digit to i64",
+        "%tens = mul i64 %value, 10",
+        "%next = add i64 %tens, %digit_wide",
+        "store i64 %next, i64* %mantissa",
+        "%added_scale = add i64 %scale, %shift",
+        "store i64 %added_scale, i64* %exponent",
+        "ret void",
+        "drop:",
+        "%dropped_shift = add i64 %shift, 1",
+        "%dropped_scale = add i64 %scale, %dropped_shift",
+        "store i64 %dropped_scale, i64* %exponent",
+        "%is_nonzero = icmp ne i32 %digit, 0",
+        "%was_inexact = load i1, i1* %is_inexact",
+        "%now_inexact = or i1 %was_inexact, %is_nonzero",
+        "store i1 %now_inexact, i1* %is_inexact",
+        "ret void",
+        "}",
+        "",
+    ],
+    # Like scanf %lf. A decimal mantissa below 2**53 with a power of ten up
+    # to 22 is exact, so one multiplication or division rounds correctly,
+    # other numbers go to strtod. Words that are not decimal numbers, e.g.
+    # inf, nan or 0x10, are consumed whole and left to strtod too, the old
+    # value is kept when it rejects them. Reads one character at a time,
+    # see @__majan_read_double for the common case.
+    "@__majan_parse_double": [
+        "define private double @__majan_parse_double(double %old) {",
+        "entry:",
+        "%token = alloca [512 x i8]",
+        "%token_length = alloca i64",
+        "%mantissa = alloca i64",
+        "%exponent = alloca i64",
+        "%is_inexact = alloca i1",
+        "%digits = alloca i64",
+        "%written_exponent = alloca i64",
+        "%word_end = alloca i8*",
+        "%token_start = getelementptr inbounds [512 x i8], [512 x i8]* %token, i64 0, i64 0",
+        "store i64 0, i64* %token_length",
+        "store i64 0, i64* %mantissa",
+        "store i64 0, i64* %exponent",
+        "store i1 false, i1* %is_inexact",
+        "store i64 0, i64* %digits",
+        "store i64 0, i64* %written_exponent",
+        "call void @__majan_skip_space()",
+        "%first = call i32 @__majan_peek()",
+        "%is_minus = icmp eq i32 %first, 45",
+        "%is_plus = icmp eq i32 %first, 43",
+        "%has_sign = or i1 %is_minus, %is_plus",
+        "br i1 %has_sign, label %sign, label %integer",
+        "sign:",
+        "call void @__majan_keep(i8* %token_start, i64* %token_length, i32 %first)",
+        "br label %integer",
+        "integer:",
+        "%integer_character = call i32 @__majan_peek()",
+        "%integer_digit = sub i32 %integer_character, 48",
+        "%is_integer_digit = icmp ult i32 %integer_digit, 10",
+        "br i1 %is_integer_digit, label %integer_next, label %point",
+        "integer_next:",
+        "call void @__majan_keep(i8* %token_start, i64* %token_length, i32 %integer_character)",
+        "call void @__majan_accumulate(i64* %mantissa, i64* %exponent, i1* %is_inexact, i32 %integer_digit, i64 0)",
+        "%integer_digits = load i64, i64* %digits",
+        "%more_integer_digits = add i64 %integer_digits, 1",
+        "store i64 %more_integer_digits, i64* %digits",
+        "br label %integer",
+        "point:",
+        "%is_point = icmp eq i32 %integer_character, 46",
+        "br i1 %is_point, label %point_next, label %exponent_mark",
+        "point_next:",
+        "call void @__majan_keep(i8* %token_start, i64* %token_length, i32 46)",
+        "br label %fraction",
+        "fraction:",
+        "%fraction_character = call i32 @__majan_peek()",
+        "%fraction_digit = sub i32 %fraction_character, 48",
+        "%is_fraction_digit = icmp ult i32 %fraction_digit, 10",
+        "br i1 %is_fraction_digit, label %fraction_next, label %exponent_mark",
+        "fraction_next:",
+        "call void @__majan_keep(i8* %token_start, i64* %token_length, i32 %fraction_character)",
+        "call void @__majan_accumulate(i64* %mantissa, i64* %exponent, i1* %is_inexact, i32 %fraction_digit, i64 -1)",
+        "%fraction_digits = load i64, i64* %digits",
+        "%more_fraction_digits = add i64 %fraction_digits, 1",
+        "store i64 %more_fraction_digits, i64* %digits",
+        "br label %fraction",
+        "exponent_mark:",
+        "%digit_count = load i64, i64* %digits",
+        "%is_missing = icmp eq i64 %digit_count, 0",
+        "br i1 %is_missing, label %word, label %exponent_check",
+        "exponent_check:",
+        "%mark = call i32 @__majan_peek()",
+        "%is_lower_e = icmp eq i32 %mark, 101",
+        "%is_upper_e = icmp eq i32 %mark, 69",
+        "%is_e = or i1 %is_lower_e, %is_upper_e",
+        "br i1 %is_e, label %exponent_sign, label %delimiter",
+        "exponent_sign:",
+        "call void @__majan_keep(i8* %token_start, i64* %token_length, i32 %mark)",
+        "%exponent_first = call i32 @__majan_peek()",
+        "%is_exponent_minus = icmp eq i32 %exponent_first, 45",
+        "%is_exponent_plus = icmp eq i32 %exponent_first, 43",
+        "%has_exponent_sign = or i1 %is_exponent_minus, %is_exponent_plus",
+        "br i1 %has_exponent_sign, label %exponent_sign_next, label %exponent_digits",
+        "exponent_sign_next:",
+        "call void @__majan_keep(i8* %token_start, i64* %token_length, i32 %exponent_first)",
+        "br label %exponent_digits",
+        "exponent_digits:",
+        "%exponent_character = call i32 @__majan_peek()",
+        "%exponent_digit = sub i32 %exponent_character, 48",
+        "%is_exponent_digit = icmp ult i32 %exponent_digit, 10",
+        "br i1 %is_exponent_digit, label %exponent_next, label %exponent_done",
+        "exponent_next:",
+        "call void @__majan_keep(i8* %token_start, i64* %token_length, i32 %exponent_character)",
+        "%exponent_value = load i64, i64* %written_exponent",
+        "%exponent_tens = mul i64 %exponent_value, 10",
+        "%exponent_digit_wide = zext i32 %exponent_digit to i64",
+        "%exponent_sum = add i64 %exponent_tens, %exponent_digit_wide",
+        "%is_exponent_large = icmp ugt i64 %exponent_sum, 100000",
+        "%exponent_capped = select i1 %is_exponent_large, i64 100000, i64 %exponent_sum",
+        "store i64 %exponent_capped, i64* %written_exponent",
+        "br label %exponent_digits",
+        "exponent_done:",
+        "%exponent_magnitude = load i64, i64* %written_exponent",
+        "%exponent_negated = sub i64 0, %exponent_magnitude",
+        "%exponent_signed = select i1 %is_exponent_minus, i64 %exponent_negated, i64 %exponent_magnitude",
+        "br label %delimiter",
+        "delimiter:",
+        "%written = phi i64 [0, %exponent_check], [%exponent_signed, %exponent_done]",
+        "%next_character = phi i32 [%mark, %exponent_check], [%exponent_character, %exponent_done]",
+        "%is_input_end = icmp eq i32 %next_character, -1",
+        "%is_next_space = call i1 @__majan_is_space(i32 %next_character)",
+        "%is_delimited = or i1 %is_input_end, %is_next_space",
+        "br i1 %is_delimited, label %convert, label %word",
+        "convert:",
+        "%scale = load i64, i64* %exponent",
+        "%decimal_exponent = add i64 %scale, %written",
+        "%value = load i64, i64* %mantissa",
+        "%inexact = load i1, i1* %is_inexact",
+        "%is_small = icmp ult i64 %value, 9007199254740992",
+        "%shifted_exponent = add i64 %decimal_exponent, 22",
+        "%is_exact_power = icmp ule i64 %shifted_exponent, 44",
+        "%is_exact_mantissa = xor i1 %inexact, true",
+        "%is_exact_value = and i1 %is_small, %is_exact_mantissa",
+        "%is_fast = and i1 %is_exact_value, %is_exact_power",
+        "br i1 %is_fast, label %fast, label %slow",
+        "fast:",
+        "%value_double = uitofp i64 %value to double",
+        "%is_division = icmp slt i64 %decimal_exponent, 0",
+        "%negative_exponent = sub i64 0, %decimal_exponent",
+        "%power_index = select i1 %is_division, i64 %negative_exponent, i64 %decimal_exponent",
+        "%power_address = getelementptr inbounds [23 x double], [23 x double]* @__majan_powers_of_ten, i64 0, i64 %power_index",
+        "%power = load double, double* %power_address",
+        "%product = fmul double %value_double, %power",
+        "%quotient = fdiv double %value_double, %power",
+        "%magnitude = select i1 %is_division, double %quotient, double %product",
+        "%negated = fneg double %magnitude",
+        "%result = select i1 %is_minus, double %negated, double %magnitude",
+        "ret double %result",
+        "slow:",
+        "%length = load i64, i64* %token_length",
+        "%terminator = getelementptr inbounds [512 x i8], [512 x i8]* %token, i64 0, i64 %length",
+        "store i8 0, i8* %terminator",
+        "%parsed = call double @strtod(i8* %token_start, i8** null)",
+        "ret double %parsed",
+        "word:",
+        "%word_character = call i32 @__majan_peek()",
+        "%is_word_end = icmp eq i32 %word_character, -1",
+        "%is_word_space = call i1 @__majan_is_space(i32 %word_character)",
+        "%is_word_done = or i1 %is_word_end, %is_word_space",
+        "br i1 %is_word_done, label %word_done, label %word_next",
+        "word_next:",
+        "call void @__majan_keep(i8* %token_start, i64* %token_length, i32 %word_character)",
+        "br label %word",
+        "word_done:",
+        "%word_length = load i64, i64* %token_length",
+        "%word_terminator = getelementptr inbounds [512 x i8], [512 x i8]* %token, i64 0, i64 %word_length",
+        "store i8 0, i8* %word_terminator",
+        "%word_value = call double @strtod(i8* %token_start, i8** %word_end)",
+        "%word_stop = load i8*, i8** %word_end",
+        "%is_rejected = icmp eq i8* %word_stop, %token_start",
+        "%word_result = select i1 %is_rejected, double %old, double %word_value",
+        "ret double %word_result",
+        "}",
+        "",
+    ],
+}
+
+runtime_dependencies = {
+    "@__majan_flush": ["@__majan_output", "@__majan_write_all"],
+    "@__majan_write_bytes": ["@__majan_flush"],
+    "@__majan_write_string": ["@__majan_write_bytes"],
+    "@__majan_write_bool": ["@__majan_write_bytes"],
+    "@__majan_write_int": ["@__majan_format_unsigned", "@__majan_write_bytes"],
+    "@__majan_write_double": ["@__majan_format_unsigned", "@__majan_write_bytes"],
+    "@__majan_peek": ["@__majan_input", "@__majan_flush"],
+    "@__majan_advance": ["@__majan_input"],
+    "@__majan_skip_space": [
+        "@__majan_peek",
+        "@__majan_advance",
+        "@__majan_is_space",
+    ],
+    "@__majan_parse_int": ["@__majan_skip_space"],
+    "@__majan_read_int": ["@__majan_skip_space", "@__majan_parse_int"],
+    "@__majan_read_string": ["@__majan_skip_space", "@__majan_release"],
+    "@__majan_keep": ["@__majan_advance"],
+    "@__majan_parse_double": [
+        "@__majan_skip_space",
+        "@__majan_is_space",
+        "@__majan_keep",
+        "@__majan_accumulate",
+        "@__majan_powers_of_ten",
+    ],
+    "@__majan_read_double": ["@__majan_is_space", "@__majan_parse_double"],
+}
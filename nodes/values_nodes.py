@@ -1,4 +1,12 @@
-from .common import Instruction, Types, ProgramMemory, Node
+from .common import (
+    Instruction,
+    Types,
+    ProgramMemory,
+    Node,
+    llvm_double,
+    variable_name,
+    wrap_int,
+)
 
 
 class Init(Node):
@@ -10,6 +18,31 @@ class Init(Node):
     def __str__(self, indent_level=0):
         return super().__str__(indent_level, f"(type: {self.variable_type})")
 
+    def evaluate(self, context):
+        next = self.left
+        while next:
+            context.types[next.name] = self.variable_type
+            next = next.left
+        return 0, None
+
+    def used_variables(self):
+        return set()
+
+    def live_variables(self, live):
+        return live
+
+    def remove_unused_variables(self, names):
+        """Drops the declared variables that are not in names."""
+        variables = []
+        next = self.left
+        while next:
+            if next.name in names:
+                variables.append(next)
+            next = next.left
+        for variable, following in zip(variables, variables[1:] + [None]):
+            variable.left = following
+        self.left = variables[0] if variables else None
+
 
 class Assign(Instruction):
     def __init__(self, line_no, left, right) -> None:
@@ -36,9 +69,117 @@ class Assign(Instruction):
     def __str__(self, indent_level=0):
         return super().__str__(indent_level)
 
+    def evaluate(self, context):
+        status, value = self.right.evaluate(context)
+        if status != 0:
+            return 1, None
+        if context.types[self.left.name] is Types.Float:
+            value = float(value)
+        context.variables[self.left.name] = value
+        return 0, None
+
+    def appended_operands(self):
+        """Returns [a, b] for 'x = x + a + b', None for other assignments."""
+        operands = []
+        node = self.right
+        while node.type == "binop" and node.op == "+":
+            operands.insert(0, node.right)
+            node = node.left
+        if operands and node.type == "variable" and node.name == self.left.name:
+            return operands
+        return None
+
+    def appended_variables(self, in_loop):
+        if in_loop and self.appended_operands():
+            return {self.left.name}
+        return set()
+
+    def allocated_variables(self):
+        if self.right.type == "binop" and self.right.op == "+":
+            return {self.left.name}
+        return set()
+
+    def assigned_variables(self):
+        return {self.left.name}
+
+    def used_variables(self):
+        return {self.left.name} | self.right.used_variables()
+
+    def live_variables(self, live):
+        return (live - {self.left.name}) | self.right.used_variables()
+
+    def is_dead_store(self, live):
+        # Concatenations allocate and divisions may trap, those stay
+        return self.left.name not in live and self.right.can_speculate()
+
+    def __write_code_append(self, output_lines, var_mem_id, operands):
+        # All operands see the old value, appending in place keeps the
+        # characters that are already there
+        _, value_mem_id, _ = self.left.write_code(output_lines)
+        appended = [operand.write_code(output_lines)[1] for operand in operands]
+        append = ProgramMemory.use_runtime_function("@__majan_append")
+        ProgramMemory.known_strings.pop(self.left.name, None)
+        capacity = ProgramMemory.increment_and_read_mem()
+        output_lines.append(
+            f"%{capacity} = load i64, i64* %{self.left.name}.capacity"
+        )
+        value = f"%{value_mem_id}"
+        kept = ProgramMemory.increment_and_read_mem()
+        output_lines.append(f"%{kept} = extractvalue %string {value}, 0")
+        for mem_id in appended:
+            pointer = ProgramMemory.increment_and_read_mem()
+            output_lines.append(f"%{pointer} = extractvalue %string %{mem_id}, 0")
+            length = ProgramMemory.increment_and_read_mem()
+            output_lines.append(f"%{length} = extractvalue %string %{mem_id}, 1")
+            result = ProgramMemory.increment_and_read_mem()
+            output_lines.append(
+                f"%{result} = call %string {append}(%string {value}, i64* %{self.left.name}.capacity, i8* %{kept}, i8* %{pointer}, i64 %{length})"
+            )
+            value = f"%{result}"
+        # The operands may point into the old buffer, it is freed once
+        # they are all appended
+        release = ProgramMemory.use_runtime_function("@__majan_release")
+        output_lines.append(
+            f"call void {release}(%string %{value_mem_id}, i64 %{capacity}, %string {value})"
+        )
+        output_lines.append(f"store %string {value}, %string* %{var_mem_id}")
+        return Types.String, var_mem_id, ""
+
+    def __write_code_ownership(self, output_lines, var_mem_id, right_mem_id):
+        # A variable owns a buffer only when + made it for the variable, the
+        # old one is freed before it is overwritten. A value copied from
+        # another variable is shared, so neither of them may free it.
+        name = self.left.name
+        source = self.right.name if self.right.type == "variable" else None
+        if source == name:
+            return
+        if name in ProgramMemory.string_owners:
+            release = ProgramMemory.use_runtime_function("@__majan_release")
+            old = ProgramMemory.increment_and_read_mem()
+            output_lines.append(f"%{old} = load %string, %string* %{var_mem_id}")
+            owned = ProgramMemory.increment_and_read_mem()
+            output_lines.append(f"%{owned} = load i64, i64* %{name}.capacity")
+            output_lines.append(
+                f"call void {release}(%string %{old}, i64 %{owned}, %string %{right_mem_id})"
+            )
+            capacity = getattr(self.right, "allocated_size", None) or "0"
+            output_lines.append(f"store i64 {capacity}, i64* %{name}.capacity")
+        if source in ProgramMemory.string_owners:
+            output_lines.append(f"store i64 0, i64* %{source}.capacity")
+
     def write_code(self, output_lines):
         var_type, var_value, var_mem_id = ProgramMemory.variables_dict[self.left.name]
+        is_builder = self.left.name in ProgramMemory.string_builders
+        known_string = self.right.static_string()
+        if var_type is Types.String and is_builder and known_string is None:
+            if self.appended_operands():
+                return self.__write_code_append(
+                    output_lines, var_mem_id, self.appended_operands()
+                )
+        # A string stored in a variable outlives the statement
+        self.right.result_escapes = True
         right_type, right_mem_id, right_value = self.right.write_code(output_lines)
+        ProgramMemory.forget_conversion(self.left.name)
         if var_type is Types.Int:
             if right_value != "":
                 output_lines.append(
@@ -50,17 +191,9 @@ class Assign(Instruction):
                 )
         if var_type is Types.Float:
             if right_type is Types.Int:
-                if right_value != "":
-                    output_lines.append(
-                        f"%{ProgramMemory.mem_counter} = sitofp i32 {right_value} to double"
-                    )
-                    right_value = ""
-                else:
-                    output_lines.append(
-                        f"%{ProgramMemory.mem_counter} = sitofp i32 %{right_mem_id} to double"
-                    )
-                right_mem_id = ProgramMemory.mem_counter
-                ProgramMemory.mem_counter += 1
+                right_mem_id, right_value = ProgramMemory.convert_to_double(
+                    output_lines, right_mem_id, right_value, variable_name(self.right)
+                )
             if right_value != "":
                 output_lines.append(
                     f"store double {right_value}, double* %{var_mem_id}, align 8"
@@ -75,15 +208,14 @@ class Assign(Instruction):
             else:
                 output_lines.append(f"store i1 %{right_mem_id}, i1* %{var_mem_id}")
         if var_type is Types.String:
-            if right_value != "":
-                output_lines.append(  # TODO not sure if we can use mem_counter here or should dereference right_mem_id
-                    f"store i8* %{ProgramMemory.mem_counter - 1}, i8** %{var_mem_id}"
-                )
-                ProgramMemory.variables_dict[self.left.name] = (
-                    var_type,
-                    right_value,
-                    var_mem_id,
-                )
+            self.__write_code_ownership(output_lines, var_mem_id, right_mem_id)
+            output_lines.append(
+                f"store %string %{right_mem_id}, %string* %{var_mem_id}"
+            )
+            if known_string is not None and ProgramMemory.string_folding:
+                ProgramMemory.known_strings[self.left.name] = known_string
+            else:
+                ProgramMemory.known_strings.pop(self.left.name, None)
         return var_type, var_mem_id, ""
 
 
@@ -100,30 +232,47 @@ class Variable(Node):
             return (1, "")
         return (0, variables_dict[self.name])
 
+    def remove_dead_code(self):
+        # Expression statement, its value is discarded
+        return []
+
+    def static_string(self):
+        return ProgramMemory.known_strings.get(self.name)
+
+    def used_variables(self):
+        return {self.name}
+
+    def can_speculate(self):
+        return True
+
+    def evaluate(self, context):
+        # Reading a variable that was never assigned gives undef in LLVM
+        if not self.name in context.variables:
+            return 1, None
+        return 0, context.variables[self.name]
+
     def __str__(self, indent_level=0):
         return super().__str__(
             indent_level, f"(name={self.name}, type={self.variable_type})"
         )
 
     def write_init_code(self, output_lines):
+        _, _, var_mem_id = ProgramMemory.variables_dict[self.name]
         if self.variable_type is Types.Int:
-            output_lines.append(
-                f"%{ProgramMemory.increment_and_read_mem()} = alloca i32, align 4"
-            )
-
+            ProgramMemory.entry_lines.append(f"%{var_mem_id} = alloca i32, align 4")
         elif self.variable_type is Types.Float:
-            output_lines.append(
-                f"%{ProgramMemory.increment_and_read_mem()} = alloca double, align 8"
+            ProgramMemory.entry_lines.append(
+                f"%{var_mem_id} = alloca double, align 8"
             )
-
         elif self.variable_type is Types.Bool:
-            output_lines.append(
-                f"%{ProgramMemory.increment_and_read_mem()} = alloca i1"
-            )
+            ProgramMemory.entry_lines.append(f"%{var_mem_id} = alloca i1")
         elif self.variable_type is Types.String:
-            output_lines.append(
-                f"%{ProgramMemory.increment_and_read_mem()} = alloca i8*"
-            )
+            ProgramMemory.entry_lines.append(f"%{var_mem_id} = alloca %string")
+            if self.name in ProgramMemory.string_owners:
+                ProgramMemory.entry_lines.append(f"%{self.name}.capacity = alloca i64")
+                ProgramMemory.entry_lines.append(
+                    f"store i64 0, i64* %{self.name}.capacity"
+                )
         return
 
     def write_code(self, output_lines):
@@ -143,11 +292,11 @@ class Variable(Node):
             )
 
         elif var_type is Types.String:
+            if self.static_string() is not None:
+                return var_type, ProgramMemory.intern_string(self.static_string()), ""
             output_lines.append(
-                f"%{ProgramMemory.increment_and_read_mem()} = load i8*, i8** %{var_mem_id}"
+                f"%{ProgramMemory.increment_and_read_mem()} = load %string, %string* %{var_mem_id}"
             )
-
-            return var_type, ProgramMemory.mem_counter - 1, var_value
         return var_type, ProgramMemory.mem_counter - 1, ""
 
 
@@ -169,6 +318,20 @@ class Value(Node):
     def write_code(self, output_lines):
         return self.value_type, -1, self.value
 
+    def can_speculate(self):
+        return True
+
+    def remove_dead_code(self):
+        # Expression statement, its value is discarded
+        return []
+
+    def evaluate(self, context):
+        if self.value_type is Types.Bool:
+            return 0, bool(self.value)
+        if self.value_type is Types.Int:
+            return 0, wrap_int(self.value)
+        return 0, self.value
+
 
 class IntValue(Value):
     def __init__(self, line_no, value):
@@ -179,6 +342,9 @@ class FloatValue(Value):
     def __init__(self, line_no, value):
         super().__init__(line_no, value, Types.Float)
 
+    def write_code(self, output_lines):
+        return self.value_type, -1, llvm_double(self.value)
+
 
 class BoolValue(Value):
     def __init__(self, line_no, value):
@@ -188,25 +354,9 @@ class BoolValue(Value):
 class StringValue(Value):
     def __init__(self, line_no, value):
         super().__init__(line_no, value, Types.String)
-        self.alias = f"str{ProgramMemory.str_alias}"
-        ProgramMemory.str_alias += 1
+
+    def static_string(self):
+        return self.value
 
     def write_code(self, output_lines):
-        l = len(self.value) + 1
-        n = f"{self.alias}"
-        ProgramMemory.header_lines.append(
-            f'@{n} = private constant [{l} x i8] c"{self.value}\\00"'
-        )
-        output_lines.append(f"%{n} = alloca [{l+1} x i8]")
-        output_lines.append(
-            f"%{ProgramMemory.mem_counter} = bitcast [{l} x i8]* %{n} to i8*"
-        )
-        output_lines.append(
-            f"call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %{ProgramMemory.increment_and_read_mem()}, i8* align 1 getelementptr inbounds ([{l} x i8], [{l} x i8]* @{n}, i32 0, i32 0), i64 {l}, i1 false)"
-        )
-        output_lines.append(f"%ptr{n} = alloca i8*")
-        output_lines.append(
-            f"%{ProgramMemory.increment_and_read_mem()} = getelementptr inbounds [{l} x i8], [{l} x i8]* %{n}, i64 0, i64 0"
-        )
-        output_lines.append(f"store i8* %{ProgramMemory.mem_counter - 1}, i8** %ptr{n}")
-        return self.value_type, f"%ptr{n}", l - 1
+        return self.value_type, ProgramMemory.intern_string(self.value), ""
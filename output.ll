@@ -0,0 +1,441 @@
+target datalayout = "e-m:e-p270:32:32-p271:32:32-p272:64:64-i64:64-f80:128-n8:16:32:64-S128"
+target triple = "x86_64-pc-linux-gnu"
+
+%string = type { i8*, i64 }
+@double = constant [ 4 x i8] c"%lf\00"
+@True = constant [5 x i8 ] c"True\00"
+@False = constant [6 x i8 ] c"False\00"
+
+declare i64 @write(i32, i8* nocapture readonly, i64) nounwind
+declare i32 @snprintf(i8* noalias nocapture writeonly, i64, i8* nocapture readonly, ...) nounwind
+declare i64 @read(i32, i8* nocapture, i64) nounwind
+declare double @strtod(i8* readonly, i8** nocapture) nounwind
+declare void @llvm.memcpy.p0i8.p0i8.i64(i8* noalias nocapture writeonly, i8* noalias nocapture readonly, i64, i1 immarg)
+declare noalias i8* @malloc(i64) nounwind
+declare void @free(i8* nocapture) nounwind
+declare i8* @llvm.stacksave()
+declare void @llvm.stackrestore(i8*)
+
+@__majan_input = internal global [65536 x i8] zeroinitializer
+@__majan_input_position = internal global i64 0
+@__majan_input_size = internal global i64 0
+
+@__majan_output = internal global [65536 x i8] zeroinitializer
+@__majan_output_size = internal global i64 0
+
+define private void @__majan_write_all(i8* %data, i64 %length) {
+entry:
+br label %check
+check:
+%written = phi i64 [0, %entry], [%next, %advance]
+%more = icmp ult i64 %written, %length
+br i1 %more, label %write, label %done
+write:
+%start = getelementptr inbounds i8, i8* %data, i64 %written
+%left = sub i64 %length, %written
+%count = call i64 @write(i32 1, i8* %start, i64 %left)
+%failed = icmp slt i64 %count, 1
+br i1 %failed, label %done, label %advance
+advance:
+%next = add i64 %written, %count
+br label %check
+done:
+ret void
+}
+
+define private void @__majan_flush() {
+entry:
+%size = load i64, i64* @__majan_output_size
+call void @__majan_write_all(i8* getelementptr inbounds ([65536 x i8], [65536 x i8]* @__majan_output, i64 0, i64 0), i64 %size)
+store i64 0, i64* @__majan_output_size
+ret void
+}
+
+define private i32 @__majan_peek() {
+entry:
+%position = load i64, i64* @__majan_input_position
+%size = load i64, i64* @__majan_input_size
+%is_buffered = icmp ult i64 %position, %size
+br i1 %is_buffered, label %byte, label %fill
+fill:
+call void @__majan_flush()
+%count = call i64 @read(i32 0, i8* getelementptr inbounds ([65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 0), i64 65536)
+%has_input = icmp sgt i64 %count, 0
+%new_size = select i1 %has_input, i64 %count, i64 0
+store i64 0, i64* @__majan_input_position
+store i64 %new_size, i64* @__majan_input_size
+br i1 %has_input, label %byte, label %end
+byte:
+%at = phi i64 [%position, %entry], [0, %fill]
+%address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %at
+%character = load i8, i8* %address
+%value = zext i8 %character to i32
+ret i32 %value
+end:
+ret i32 -1
+}
+
+define private void @__majan_advance() {
+entry:
+%position = load i64, i64* @__majan_input_position
+%next = add i64 %position, 1
+store i64 %next, i64* @__majan_input_position
+ret void
+}
+
+define private i1 @__majan_is_space(i32 %character) {
+entry:
+%is_blank = icmp eq i32 %character, 32
+%control = sub i32 %character, 9
+%is_control = icmp ult i32 %control, 5
+%is_space = or i1 %is_blank, %is_control
+ret i1 %is_space
+}
+
+define private void @__majan_skip_space() {
+entry:
+br label %block
+block:
+%character = call i32 @__majan_peek()
+%is_end = icmp eq i32 %character, -1
+br i1 %is_end, label %done, label %scan_start
+scan_start:
+%start = load i64, i64* @__majan_input_position
+%size = load i64, i64* @__majan_input_size
+br label %scan
+scan:
+%index = phi i64 [%start, %scan_start], [%next, %skip]
+%is_buffered = icmp ult i64 %index, %size
+br i1 %is_buffered, label %byte, label %refill
+byte:
+%address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %index
+%byte_value = load i8, i8* %address
+%byte_wide = zext i8 %byte_value to i32
+%is_space = call i1 @__majan_is_space(i32 %byte_wide)
+br i1 %is_space, label %skip, label %stop
+skip:
+%next = add i64 %index, 1
+br label %scan
+refill:
+store i64 %index, i64* @__majan_input_position
+br label %block
+stop:
+store i64 %index, i64* @__majan_input_position
+br label %done
+done:
+ret void
+}
+
+define private i32 @__majan_parse_int(i32 %old) {
+entry:
+call void @__majan_skip_space()
+%first = call i32 @__majan_peek()
+%is_minus = icmp eq i32 %first, 45
+%is_plus = icmp eq i32 %first, 43
+%has_sign = or i1 %is_minus, %is_plus
+br i1 %has_sign, label %sign, label %digits
+sign:
+call void @__majan_advance()
+br label %digits
+digits:
+br label %digit
+digit:
+%value = phi i64 [0, %digits], [%next, %accumulate]
+%count = phi i64 [0, %digits], [%next_count, %accumulate]
+%character = call i32 @__majan_peek()
+%digit_value = sub i32 %character, 48
+%is_digit = icmp ult i32 %digit_value, 10
+br i1 %is_digit, label %accumulate, label %done
+accumulate:
+call void @__majan_advance()
+%digit_wide = zext i32 %digit_value to i64
+%tens = mul i64 %value, 10
+%next = add i64 %tens, %digit_wide
+%next_count = add i64 %count, 1
+br label %digit
+done:
+%is_missing = icmp eq i64 %count, 0
+%negated = sub i64 0, %value
+%signed = select i1 %is_minus, i64 %negated, i64 %value
+%result = trunc i64 %signed to i32
+%final = select i1 %is_missing, i32 %old, i32 %result
+ret i32 %final
+}
+
+define private i32 @__majan_read_int(i32 %old) {
+entry:
+call void @__majan_skip_space()
+%first = call i32 @__majan_peek()
+%start = load i64, i64* @__majan_input_position
+%size = load i64, i64* @__majan_input_size
+%is_minus = icmp eq i32 %first, 45
+%is_plus = icmp eq i32 %first, 43
+%has_sign = or i1 %is_minus, %is_plus
+%sign_length = zext i1 %has_sign to i64
+%digits_start = add i64 %start, %sign_length
+br label %scan
+scan:
+%index = phi i64 [%digits_start, %entry], [%next, %digit]
+%value = phi i64 [0, %entry], [%next_value, %digit]
+%is_buffered = icmp ult i64 %index, %size
+br i1 %is_buffered, label %byte, label %slow
+byte:
+%address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %index
+%character = load i8, i8* %address
+%character_wide = zext i8 %character to i64
+%digit_value = sub i64 %character_wide, 48
+%is_digit = icmp ult i64 %digit_value, 10
+br i1 %is_digit, label %digit, label %stop
+digit:
+%tens = mul i64 %value, 10
+%next_value = add i64 %tens, %digit_value
+%next = add i64 %index, 1
+br label %scan
+stop:
+%is_missing = icmp eq i64 %index, %digits_start
+br i1 %is_missing, label %slow, label %done
+done:
+store i64 %index, i64* @__majan_input_position
+%negated = sub i64 0, %value
+%signed = select i1 %is_minus, i64 %negated, i64 %value
+%result = trunc i64 %signed to i32
+ret i32 %result
+slow:
+%parsed = call i32 @__majan_parse_int(i32 %old)
+ret i32 %parsed
+}
+
+define private void @__majan_release(%string %old, i64 %capacity, %string %new) {
+entry:
+%is_owned = icmp ne i64 %capacity, 0
+br i1 %is_owned, label %compare, label %done
+compare:
+%old_pointer = extractvalue %string %old, 0
+%new_pointer = extractvalue %string %new, 0
+%is_moved = icmp ne i8* %old_pointer, %new_pointer
+br i1 %is_moved, label %release, label %done
+release:
+call void @free(i8* %old_pointer)
+br label %done
+done:
+ret void
+}
+
+define private %string @__majan_read_string(%string %old, i64* %owned) {
+entry:
+call void @__majan_skip_space()
+%initial = call i8* @malloc(i64 16)
+br label %chunk
+chunk:
+%buffer = phi i8* [%initial, %entry], [%target, %copy]
+%capacity = phi i64 [16, %entry], [%new_capacity, %copy]
+%length = phi i64 [0, %entry], [%new_length, %copy]
+%character = call i32 @__majan_peek()
+%is_end = icmp eq i32 %character, -1
+br i1 %is_end, label %done, label %scan_start
+scan_start:
+%start = load i64, i64* @__majan_input_position
+%size = load i64, i64* @__majan_input_size
+br label %scan
+scan:
+%index = phi i64 [%start, %scan_start], [%next_index, %scan_next]
+%is_buffered = icmp ult i64 %index, %size
+br i1 %is_buffered, label %scan_byte, label %append
+scan_byte:
+%address = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %index
+%byte = load i8, i8* %address
+%byte_value = zext i8 %byte to i32
+%is_space = call i1 @__majan_is_space(i32 %byte_value)
+br i1 %is_space, label %append, label %scan_next
+scan_next:
+%next_index = add i64 %index, 1
+br label %scan
+append:
+%end = phi i64 [%index, %scan], [%index, %scan_byte]
+%is_word_end = phi i1 [false, %scan], [true, %scan_byte]
+%count = sub i64 %end, %start
+%new_length = add i64 %length, %count
+%needed = add i64 %new_length, 1
+%fits = icmp ule i64 %needed, %capacity
+br i1 %fits, label %copy, label %grow
+grow:
+%doubled = shl i64 %capacity, 1
+%is_enough = icmp uge i64 %doubled, %needed
+%grown = select i1 %is_enough, i64 %doubled, i64 %needed
+%larger = call i8* @malloc(i64 %grown)
+call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %larger, i8* align 1 %buffer, i64 %length, i1 false)
+call void @free(i8* %buffer)
+br label %copy
+copy:
+%target = phi i8* [%buffer, %append], [%larger, %grow]
+%new_capacity = phi i64 [%capacity, %append], [%grown, %grow]
+%destination = getelementptr inbounds i8, i8* %target, i64 %length
+%source = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_input, i64 0, i64 %start
+call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %destination, i8* align 1 %source, i64 %count, i1 false)
+store i64 %end, i64* @__majan_input_position
+br i1 %is_word_end, label %done, label %chunk
+done:
+%result_buffer = phi i8* [%buffer, %chunk], [%target, %copy]
+%result_capacity = phi i64 [%capacity, %chunk], [%new_capacity, %copy]
+%result_length = phi i64 [%length, %chunk], [%new_length, %copy]
+%is_missing = icmp eq i64 %result_length, 0
+br i1 %is_missing, label %missing, label %found
+missing:
+call void @free(i8* %result_buffer)
+ret %string %old
+found:
+%terminator = getelementptr inbounds i8, i8* %result_buffer, i64 %result_length
+store i8 0, i8* %terminator
+%with_pointer = insertvalue %string undef, i8* %result_buffer, 0
+%result = insertvalue %string %with_pointer, i64 %result_length, 1
+%old_capacity = load i64, i64* %owned
+call void @__majan_release(%string %old, i64 %old_capacity, %string %result)
+store i64 %result_capacity, i64* %owned
+ret %string %result
+}
+
+@str1 = private unnamed_addr constant [1 x i8] c"\00"
+define private %string @__majan_append(%string %value, i64* %capacity, i8* %kept, i8* %data, i64 %length) {
+entry:
+%pointer = extractvalue %string %value, 0
+%size = extractvalue %string %value, 1
+%new_size = add i64 %size, %length
+%needed = add i64 %new_size, 1
+%current = load i64, i64* %capacity
+%fits = icmp ule i64 %needed, %current
+br i1 %fits, label %append, label %grow
+grow:
+%doubled = shl i64 %current, 1
+%is_enough = icmp uge i64 %doubled, %needed
+%grown = select i1 %is_enough, i64 %doubled, i64 %needed
+%is_small = icmp ult i64 %grown, 16
+%new_capacity = select i1 %is_small, i64 16, i64 %grown
+%buffer = call i8* @malloc(i64 %new_capacity)
+call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %buffer, i8* align 1 %pointer, i64 %size, i1 false)
+store i64 %new_capacity, i64* %capacity
+%is_owned = icmp ne i64 %current, 0
+%is_kept = icmp eq i8* %pointer, %kept
+%is_kept_or_shared = select i1 %is_owned, i1 %is_kept, i1 true
+br i1 %is_kept_or_shared, label %append, label %release
+release:
+call void @free(i8* %pointer)
+br label %append
+append:
+%target = phi i8* [%pointer, %entry], [%buffer, %grow], [%buffer, %release]
+%end = getelementptr inbounds i8, i8* %target, i64 %size
+call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %end, i8* align 1 %data, i64 %length, i1 false)
+%terminator = getelementptr inbounds i8, i8* %target, i64 %new_size
+store i8 0, i8* %terminator
+%with_pointer = insertvalue %string undef, i8* %target, 0
+%result = insertvalue %string %with_pointer, i64 %new_size, 1
+ret %string %result
+}
+
+define private i8* @__majan_format_unsigned(i64 %value, i8* %end) {
+entry:
+br label %digit
+digit:
+%rest = phi i64 [%value, %entry], [%quotient, %digit]
+%position = phi i8* [%end, %entry], [%first, %digit]
+%quotient = udiv i64 %rest, 10
+%tens = mul i64 %quotient, 10
+%remainder = sub i64 %rest, %tens
+%remainder_byte = trunc i64 %remainder to i8
+%character = add i8 %remainder_byte, 48
+%first = getelementptr inbounds i8, i8* %position, i64 -1
+store i8 %character, i8* %first
+%is_last = icmp eq i64 %quotient, 0
+br i1 %is_last, label %done, label %digit
+done:
+ret i8* %first
+}
+
+define private void @__majan_write_bytes(i8* %data, i64 %length) {
+entry:
+%size = load i64, i64* @__majan_output_size
+%new_size = add i64 %size, %length
+%fits = icmp ule i64 %new_size, 65536
+br i1 %fits, label %copy, label %flush
+flush:
+call void @__majan_flush()
+%is_small = icmp ule i64 %length, 65536
+br i1 %is_small, label %copy, label %direct
+direct:
+call void @__majan_write_all(i8* %data, i64 %length)
+ret void
+copy:
+%start = phi i64 [%size, %entry], [0, %flush]
+%target = getelementptr inbounds [65536 x i8], [65536 x i8]* @__majan_output, i64 0, i64 %start
+call void @llvm.memcpy.p0i8.p0i8.i64(i8* align 1 %target, i8* align 1 %data, i64 %length, i1 false)
+%end = add i64 %start, %length
+store i64 %end, i64* @__majan_output_size
+ret void
+}
+
+define private void @__majan_write_int(i32 %value) {
+entry:
+%text = alloca [24 x i8]
+%end = getelementptr inbounds [24 x i8], [24 x i8]* %text, i64 0, i64 24
+%wide = sext i32 %value to i64
+%is_negative = icmp slt i64 %wide, 0
+%negated = sub i64 0, %wide
+%magnitude = select i1 %is_negative, i64 %negated, i64 %wide
+%digits = call i8* @__majan_format_unsigned(i64 %magnitude, i8* %end)
+%minus = getelementptr inbounds i8, i8* %digits, i64 -1
+store i8 45, i8* %minus
+%start = select i1 %is_negative, i8* %minus, i8* %digits
+%start_address = ptrtoint i8* %start to i64
+%end_address = ptrtoint i8* %end to i64
+%length = sub i64 %end_address, %start_address
+call void @__majan_write_bytes(i8* %start, i64 %length)
+ret void
+}
+
+
+define dso_local i32 @main() #0 {
+entry:
+%w.capacity = alloca i64
+store i64 0, i64* %w.capacity
+%s.capacity = alloca i64
+store i64 0, i64* %s.capacity
+%str1.pointer = insertvalue %string undef, i8* getelementptr inbounds ([1 x i8], [1 x i8]* @str1, i64 0, i64 0), 0
+%str1.value = insertvalue %string %str1.pointer, i64 0, 1
+%0 = call i32 @__majan_read_int(i32 undef)
+%1 = call %string @__majan_read_string(%string undef, i64* %w.capacity)
+%2 = icmp slt i32 0 , %0
+br i1 %2, label %l1.preheader, label %l2
+l1.preheader:
+%3 = extractvalue %string %str1.value, 0
+br label %l1
+l1:
+%4 = phi %string [undef, %l1.preheader], [%15, %l1]
+%5 = phi %string [%1, %l1.preheader], [%16, %l1]
+%6 = phi i32 [0, %l1.preheader], [%17, %l1]
+%7 = load i64, i64* %s.capacity
+call void @__majan_release(%string %4, i64 %7, %string %str1.value)
+store i64 0, i64* %s.capacity
+%8 = extractvalue %string %5, 0
+%9 = extractvalue %string %5, 1
+%10 = call %string @__majan_append(%string %str1.value, i64* %s.capacity, i8* %3, i8* %8, i64 %9)
+%11 = call %string @__majan_append(%string %10, i64* %s.capacity, i8* %3, i8* %8, i64 %9)
+%12 = call %string @__majan_append(%string %11, i64* %s.capacity, i8* %3, i8* %8, i64 %9)
+%13 = call %string @__majan_append(%string %12, i64* %s.capacity, i8* %3, i8* %8, i64 %9)
+%14 = call %string @__majan_append(%string %13, i64* %s.capacity, i8* %3, i8* %8, i64 %9)
+%15 = call %string @__majan_append(%string %14, i64* %s.capacity, i8* %3, i8* %8, i64 %9)
+call void @__majan_release(%string %str1.value, i64 0, %string %15)
+%16 = call %string @__majan_read_string(%string %5, i64* %w.capacity)
+%17 = add nsw i32 %6, 1
+%18 = icmp slt i32 %17 , %0
+br i1 %18, label %l1, label %l2, !llvm.loop !0
+l2:
+%19 = phi %string [undef, %entry], [%15, %l1]
+%20 = extractvalue %string %19, 1
+%21 = trunc i64 %20 to i32
+call void @__majan_write_int(i32 %21)
+call void @__majan_flush()
+ret i32 0
+}
+
+attributes #0 = { norecurse nounwind }
+
+!0 = distinct !{!0}
\ No newline at end of file
@@ -185,13 +185,6 @@ def p_instruction_assignment_exp(p):
     p[0] = Assign(p.lineno(1), Variable(p.lineno(2), p[1]), p[3])
 
 
-def p_instruction_assignment_string(p):
-    """instruction : ID ASSIGNMENT STRING_VALUE SEMICOLON"""
-    p[0] = Assign(
-        p.lineno(1), Variable(p.lineno(2), p[1]), StringValue(p.lineno(3), p[3])
-    )
-
-
 def p_expression_binop(p):
     """expression : expression PLUS expression
     | expression MINUS expression
@@ -235,6 +228,11 @@ def p_expression_bool_value(p):
     p[0] = BoolValue(p.lineno(1), p[1])
 
 
+def p_expression_string_value(p):
+    "expression : STRING_VALUE"
+    p[0] = StringValue(p.lineno(1), p[1])
+
+
 def p_expression_int_vars_init(p):
     "init : INT int_ids"
     p[0] = Init(p.lineno(1), Types.Int , p[2])